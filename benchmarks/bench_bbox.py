@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ocr.bbox import OCRBBoxProcessor
+
+
+def synthetic_page(rng, n_boxes, width=1240, line_height=22, line_gap=14):
+    # Rows of text boxes like a bank statement: several columns per line with jittered edges
+    boxes = []
+    y = 20.0
+    while len(boxes) < n_boxes:
+        x = 20.0
+        for _ in range(rng.integers(1, 6)):
+            w = rng.uniform(40, 260)
+            if x + w > width:
+                break
+            jitter = rng.uniform(-2, 2, size=4)
+            boxes.append([x + jitter[0], y + jitter[1], x + w + jitter[2], y + line_height + jitter[3]])
+            x += w + rng.uniform(10, 80)
+            if len(boxes) == n_boxes:
+                break
+        y += line_height + line_gap + rng.uniform(-4, 12)
+    return boxes
+
+
+def canonical(boxes):
+    return [tuple(round(float(v), 6) for v in box) for box in boxes]
+
+
+def check_equivalence(processor, rng, pages, n_boxes, iou_threshold, proximity_threshold):
+    mismatches = 0
+    for _ in range(pages):
+        boxes = synthetic_page(rng, n_boxes)
+        reference = processor.merge_boxes_iterative(boxes, iou_threshold, proximity_threshold)
+        fast = processor.merge_boxes_vectorized(boxes, iou_threshold, proximity_threshold)
+        if canonical(reference) != canonical(fast):
+            mismatches += 1
+    return mismatches
+
+
+def time_call(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and cross-check OCRBBoxProcessor merge engines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=50, help="Random pages per size for the equivalence check.")
+    parser.add_argument("--iou-threshold", type=float, default=0.5)
+    parser.add_argument("--proximity-threshold", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    processor = OCRBBoxProcessor()
+    rng = np.random.default_rng(args.seed)
+    report = []
+    failed = False
+    for n in args.sizes:
+        mismatches = check_equivalence(processor, rng, args.pages, n, args.iou_threshold, args.proximity_threshold)
+        failed |= mismatches > 0
+        boxes = synthetic_page(rng, n)
+        iterative = time_call(lambda: processor.merge_boxes_iterative(boxes, args.iou_threshold, args.proximity_threshold), args.repeat)
+        vectorized = time_call(lambda: processor.merge_boxes_vectorized(boxes, args.iou_threshold, args.proximity_threshold), args.repeat)
+        expand_boxes = [list(b) for b in boxes]
+        report.append({
+            "boxes": n,
+            "equivalence_mismatches": mismatches,
+            "iterative_ms": round(iterative * 1000, 3),
+            "vectorized_ms": round(vectorized * 1000, 3),
+            "speedup": round(iterative / vectorized, 2) if vectorized else None,
+            "expand_ms": round(time_call(lambda: processor.expand_boxes_y(expand_boxes, y_expand=6, x_expand=10), args.repeat) * 1000, 3),
+        })
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
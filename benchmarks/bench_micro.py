@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import write_report
+from fakes import FakeOllama
+from bench_bbox import synthetic_page
+
+WALLET_RECEIPT = [
+    "Fund Transfer to Wallet",
+    "Reference Code 123456789",
+    "Date/Time 12 Mar 2025, 03:45 PM.",
+    "Channel App",
+    "Payment Attribute Transfer",
+    "Service Name eSewa",
+    "Amount (NPR) 1,250.00",
+    "Initiator 98XXXXXXXX",
+    "Receiver Name Ram Bahadur",
+    "Status COMPLETE",
+]
+
+
+def measure(fn, repeat, number=1):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    timings = np.asarray(timings) * 1e6
+    return {
+        "median_us": round(float(np.median(timings)), 3),
+        "min_us": round(float(timings.min()), 3),
+        "ops_per_sec": round(1e6 / float(np.median(timings)), 1),
+    }
+
+
+def bench_bbox(args):
+    from src.ocr.bbox import OCRBBoxProcessor
+    processor = OCRBBoxProcessor()
+    rng = np.random.default_rng(args.seed)
+    results = {}
+    for n in args.box_counts:
+        boxes = synthetic_page(rng, n)
+        results[f"merge_boxes_iterative[{n}]"] = measure(lambda: processor.merge_boxes_iterative(boxes, 0.5, 20), args.repeat)
+        results[f"merge_boxes_vectorized[{n}]"] = measure(lambda: processor.merge_boxes_vectorized(boxes, 0.5, 20), args.repeat)
+    return results
+
+
+def bench_parse_kvp(args):
+    from src.ocr.kvp_extract import OCRKVPExtractor
+    extractor = OCRKVPExtractor()
+    structured_result = [{"text": line} for line in WALLET_RECEIPT]
+    return {"parse_kvp_response[wallet_transfer]": measure(lambda: extractor.parse_kvp_response(structured_result), args.repeat, 100)}
+
+
+def bench_embedding(args):
+    FakeOllama(embed_latency_ms=0, embed_per_item_ms=0).install()
+    from src.core.embedder import Embedder
+    from src.core.embedding_cache import EmbeddingCache
+
+    texts = [f"Receipt {i}: paid NPR {i * 13} to Merchant {i % 7}" for i in range(args.embed_batch)]
+    embedder = Embedder()
+    results = {}
+
+    def run(coroutine):
+        return asyncio.run(coroutine)
+
+    uncached = Embedder()
+    uncached.cache = None
+    results[f"embed_uncached[{len(texts)}]"] = measure(lambda: run(uncached.get_embedding(texts)), args.repeat)
+    embedder.cache = EmbeddingCache(embedder.model_name, path=os.path.join(args.workdir, "micro.sqlite"))
+    run(embedder.get_embedding(texts))
+    results[f"embed_memory_hit[{len(texts)}]"] = measure(lambda: run(embedder.get_embedding(texts)), args.repeat)
+    cold = EmbeddingCache(embedder.model_name, path=os.path.join(args.workdir, "micro.sqlite"))
+
+    def disk_hit():
+        cold._memory.clear()
+        cold.get_many(texts)
+    results[f"embed_disk_hit[{len(texts)}]"] = measure(disk_hit, args.repeat)
+    return results
+
+
+BENCHES = {"bbox": bench_bbox, "parse_kvp": bench_parse_kvp, "embedding": bench_embedding}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for box merging, KVP parsing and the embedding path.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHES), default=list(BENCHES))
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--embed-batch", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file as well.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.setdefault("EMBED_CACHE_PATH", os.path.join(workdir, "embeddings.sqlite"))
+        args.workdir = workdir
+        results = {}
+        for name in args.only:
+            results.update(BENCHES[name](args))
+        config = {key: value for key, value in vars(args).items() if key != "workdir"}
+    write_report("micro", config, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
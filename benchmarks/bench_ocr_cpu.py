@@ -0,0 +1,159 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import ROOT, latency_summary, write_report
+
+# Each variant runs in its own interpreter: thread pools and loaded models are process-wide.
+# The result cache is off so repeated images are really recognized
+VARIANTS = {
+    "stock": {"OCR_CACHE_ENABLED": "false"},
+    "fp32": {"OCR_CACHE_ENABLED": "false", "OCR_CPU_MODE": "true"},
+    "int8": {"OCR_CACHE_ENABLED": "false", "OCR_CPU_MODE": "true", "OCR_QUANTIZE_INT8": "true"},
+    "bf16": {"OCR_CACHE_ENABLED": "false", "OCR_CPU_MODE": "true", "OCR_BF16": "true"},
+    "compile": {"OCR_CACHE_ENABLED": "false", "OCR_CPU_MODE": "true", "OCR_COMPILE": "true"},
+    "int8_compile": {"OCR_CACHE_ENABLED": "false", "OCR_CPU_MODE": "true", "OCR_QUANTIZE_INT8": "true", "OCR_COMPILE": "true"},
+}
+IMAGE_PATTERNS = ("*.png", "*.jpg", "*.jpeg")
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def cer(prediction: str, reference: str) -> float:
+    return edit_distance(prediction, reference) / max(1, len(reference))
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def load_held_out(directory: str):
+    # Ground truth is a sidecar <image stem>.txt next to each receipt image
+    samples = []
+    for pattern in IMAGE_PATTERNS:
+        for image_path in sorted(glob.glob(os.path.join(directory, pattern))):
+            label_path = os.path.splitext(image_path)[0] + ".txt"
+            if os.path.exists(label_path):
+                with open(label_path, encoding="utf-8") as f:
+                    samples.append({"image": image_path, "text": f.read()})
+    return samples
+
+
+def kvp_reader():
+    # The ingestion path behind /ocr_kvp*: layout, box merge, then recognition of each merged box
+    from src.ocr.image_io import load_image
+    from src.ocr.kvp_extract import OCRKVPExtractor
+
+    extractor = OCRKVPExtractor()
+
+    def read(image_path):
+        image = load_image(image_path)
+        _, boxes = extractor.analyze_boxes([image])[0]
+        lines = extractor.ocr.ocr_bbox_batch([(image, boxes)])[0]
+        return " ".join(line["text"] for line in lines)
+    return read
+
+
+def text_reader():
+    from src.ocr.ocrsurya import OCR
+    return OCR().extract_text
+
+
+def worker(images, warmup: int, path: str):
+    from src.core.model_registry import model_registry
+
+    read = kvp_reader() if path == "kvp" else text_reader()
+    start = time.perf_counter()
+    for image in images[:warmup]:
+        read(image)
+    warmup_seconds = time.perf_counter() - start
+    outputs = []
+    for image in images:
+        start = time.perf_counter()
+        text = read(image)
+        outputs.append({"image": image, "seconds": time.perf_counter() - start, "text": text})
+    return {"warmup_seconds": round(warmup_seconds, 3), "outputs": outputs, "registry": model_registry.stats()}
+
+
+def run_variant(name, samples, args):
+    env = dict(os.environ, **VARIANTS[name])
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", "--warmup", str(args.warmup), "--path", args.path,
+        "--images", *[s["image"] for s in samples],
+    ]
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        tail = completed.stderr.strip().splitlines()[-1:] or ["failed"]
+        return {"error": tail[0]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(run, samples, baseline=None):
+    references = [normalize(sample["text"]) for sample in samples]
+    predictions = [normalize(output["text"]) for output in run["outputs"]]
+    wall = sum(output["seconds"] for output in run["outputs"])
+    summary = latency_summary([output["seconds"] for output in run["outputs"]], wall)
+    summary["cer"] = round(sum(cer(p, r) for p, r in zip(predictions, references)) / len(samples), 4)
+    summary["warmup_seconds"] = run["warmup_seconds"]
+    summary["registry"] = run["registry"]
+    if baseline is not None:
+        baseline_predictions = [normalize(output["text"]) for output in baseline["outputs"]]
+        summary["cer_delta_vs_fp32"] = round(summary["cer"] - baseline["cer"], 4)
+        summary["p50_speedup_vs_fp32"] = round(baseline["p50_ms"] / summary["p50_ms"], 3) if summary["p50_ms"] else None
+        # How far the optimized output drifts from the fp32 output, independent of the labels
+        summary["cer_vs_fp32_output"] = round(
+            sum(cer(p, b) for p, b in zip(predictions, baseline_predictions)) / len(samples), 4
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-image OCR latency and character error rate for each CPU inference variant.")
+    parser.add_argument("--held-out", help="Directory of receipt images, each with a <stem>.txt ground-truth transcript.")
+    parser.add_argument("--variants", nargs="+", default=["fp32", "int8", "bf16", "compile", "int8_compile"], choices=list(VARIANTS))
+    parser.add_argument("--warmup", type=int, default=2, help="Images run once before timing (model load, compilation).")
+    parser.add_argument("--path", choices=["kvp", "text"], default="kvp",
+                        help="kvp: layout, box merge and recognition as in /ocr_kvp*; text: full-page extract_text.")
+    parser.add_argument("--output", help="Write the JSON report to this file as well.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--images", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.images, args.warmup, args.path)))
+        return
+    if not args.held_out:
+        parser.error("--held-out is required")
+    samples = load_held_out(args.held_out)
+    if not samples:
+        parser.error(f"no labelled images found in {args.held_out}")
+
+    variants = ["fp32"] + [variant for variant in args.variants if variant != "fp32"]
+    results = {}
+    baseline = None
+    for variant in variants:
+        run = run_variant(variant, samples, args)
+        if "error" in run:
+            results[variant] = run
+            continue
+        results[variant] = summarize(run, samples, baseline)
+        if variant == "fp32":
+            baseline = {**results[variant], "outputs": run["outputs"]}
+    config = {key: value for key, value in vars(args).items() if key not in ("worker", "images")}
+    write_report("ocr_cpu", {**config, "samples": len(samples)}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+
+from common import latency_summary, write_report
+from fakes import FakeOCRKVPExtractor, FakeOllama, InProcessChroma
+
+ENDPOINTS = ["query", "query_stream", "add_docs", "add_docs_bulk", "ocr_kvp_add_docs", "ocr_kvp_add_docs_upload"]
+
+QUESTIONS = [
+    "How much did I spend on groceries?",
+    "Show my transfers to Merchant {n}",
+    "What was my largest payment in March?",
+    "List the failed transactions",
+    "When did I last pay Merchant {n}?",
+]
+
+
+def configure_environment(args, workdir):
+    # Settings are read from the environment when src.config is first imported
+    os.environ.setdefault("OCR_WARMUP", "false")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite")
+    os.environ["JOB_DB_PATH"] = os.path.join(workdir, "jobs.sqlite")
+    os.environ["ANSWER_CACHE_ENABLED"] = "true" if args.answer_cache else "false"
+    os.environ["EMBED_CACHE_ENABLED"] = "true" if args.embed_cache else "false"
+
+
+def make_request(endpoint, index, rng):
+    if endpoint in ("query", "query_stream"):
+        prompt = rng.choice(QUESTIONS).format(n=rng.randrange(7)) + f" #{index}"
+        return {"method": "POST", "url": "/query" if endpoint == "query" else "/query/stream", "json": {"prompt": prompt}}
+    if endpoint == "add_docs":
+        docs = [{"id": f"doc_{index}_{i}", "content": f"Receipt {index}-{i}: paid NPR {rng.randrange(10000)} to Merchant {rng.randrange(7)}"} for i in range(4)]
+        return {"method": "POST", "url": "/add_docs", "json": {"documents": docs}}
+    if endpoint == "add_docs_bulk":
+        lines = [
+            '{"id": "bulk_%d_%d", "content": "%s"}' % (index, i, ("Statement line %d " % i) * rng.randrange(5, 200))
+            for i in range(20)
+        ]
+        return {"method": "POST", "url": "/add_docs/bulk", "content": "\n".join(lines).encode()}
+    if endpoint == "ocr_kvp_add_docs":
+        return {"method": "POST", "url": "/ocr_kvp_add_docs", "json": {"image_path": f"receipt_{index}.jpg"}}
+    if endpoint == "ocr_kvp_add_docs_upload":
+        return {"method": "POST", "url": "/ocr_kvp_add_docs/upload", "files": {"file": (f"receipt_{index}.jpg", io.BytesIO(os.urandom(2048)), "image/jpeg")}}
+    raise ValueError(endpoint)
+
+
+async def drive(client, endpoint, requests, concurrency, rng):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(index):
+        nonlocal errors
+        request = make_request(endpoint, index, rng)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                if endpoint == "query_stream":
+                    async for _ in response.aiter_lines():
+                        pass
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latency_summary(latencies, time.perf_counter() - start, errors)
+
+
+async def seed_collection(client, docs):
+    documents = [{"id": f"seed_{i}", "content": f"Seed receipt {i}: paid NPR {i * 37 % 9000} to Merchant {i % 7}"} for i in range(docs)]
+    for start in range(0, len(documents), 64):
+        await client.post("/add_docs", json={"documents": documents[start:start + 64]})
+
+
+async def main_async(args):
+    import httpx
+
+    fake_ollama = FakeOllama(
+        embed_latency_ms=args.embed_latency_ms,
+        generate_latency_ms=args.generate_latency_ms,
+        ttft_ms=args.ttft_ms,
+    )
+    fake_ollama.install()
+    InProcessChroma().install()
+
+    import server
+    server.ocr_kvp = FakeOCRKVPExtractor(latency_ms=args.ocr_latency_ms)
+
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=server.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await seed_collection(client, args.seed_docs)
+        for endpoint in args.endpoints:
+            results[endpoint] = await drive(client, endpoint, args.requests, args.concurrency, rng)
+        if args.mixed:
+            # /query latency while OCR jobs saturate the OCR pool
+            ocr = asyncio.create_task(drive(client, "ocr_kvp_add_docs", args.requests, args.concurrency, rng))
+            results["query_under_ocr_load"] = await drive(client, "query", args.requests, args.concurrency, rng)
+            results["ocr_under_query_load"] = await ocr
+    results["fake_ollama"] = {
+        "embed_calls": fake_ollama.embed_calls,
+        "embed_inputs": fake_ollama.embed_inputs,
+        "generate_calls": fake_ollama.generate_calls,
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of server.py with fake Ollama and in-process Chroma.")
+    parser.add_argument("--endpoints", nargs="+", default=["query", "add_docs", "ocr_kvp_add_docs"], choices=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed-docs", type=int, default=500)
+    parser.add_argument("--embed-latency-ms", type=float, default=20)
+    parser.add_argument("--generate-latency-ms", type=float, default=500)
+    parser.add_argument("--ttft-ms", type=float, default=150)
+    parser.add_argument("--ocr-latency-ms", type=float, default=800)
+    parser.add_argument("--mixed", action="store_true", help="Also measure /query while OCR requests run.")
+    parser.add_argument("--answer-cache", action="store_true", help="Leave the semantic answer cache enabled.")
+    parser.add_argument("--embed-cache", action="store_true", help="Leave the embedding cache enabled.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file as well.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir)
+        results = asyncio.run(main_async(args))
+    write_report("server", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
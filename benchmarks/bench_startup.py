@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, write_report
+
+ROLES = ["query", "ingest", "ocr", "all"]
+HEAVY_MODULES = ["torch", "transformers", "surya", "chromadb", "ollama", "PIL", "numpy"]
+
+# Runs in a fresh interpreter so every role pays its own cold imports
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "import_seconds": elapsed,
+    "routes": sorted(server.app.openapi()["paths"]),
+    "loaded": {name: name in sys.modules for name in %r},
+}))
+"""
+
+
+def parse_importtime(stderr: str, top: int):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        name = name.strip()
+        # Root packages only, wherever they were first imported from; server itself is the total
+        if "." in name or name == "server":
+            continue
+        rows.append((int(cumulative_us), name))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def probe(role: str, workdir: str, top: int):
+    env = dict(os.environ)
+    env.update(
+        SERVER_ROLE=role,
+        EMBED_CACHE_PATH=os.path.join(workdir, f"{role}_embeddings.sqlite"),
+        JOB_DB_PATH=os.path.join(workdir, f"{role}_jobs.sqlite"),
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE % (HEAVY_MODULES,)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["import_seconds"] = round(result["import_seconds"], 3)
+    result["slowest_imports"] = parse_importtime(completed.stderr, top)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of server.py and the heavy modules it pulls in, per SERVER_ROLE.")
+    parser.add_argument("--roles", nargs="+", default=ROLES, choices=ROLES)
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts per role; the fastest is reported.")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to list.")
+    parser.add_argument("--output", help="Write the JSON report to this file as well.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for role in args.roles:
+            runs = [probe(role, workdir, args.top) for _ in range(args.repeat)]
+            ok = [run for run in runs if "error" not in run]
+            results[role] = min(ok, key=lambda run: run["import_seconds"]) if ok else runs[0]
+    write_report("startup", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
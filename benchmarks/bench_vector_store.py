@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from common import latency_summary, write_report
+from src.config import settings
+from src.core.vector_store import LocalCollection, open_collection
+
+# local_ivf is the local backend with the IVF index forced on regardless of collection size
+BACKENDS = ["persistent", "local", "local_ivf", "http"]
+
+
+def synthetic_collection(rows, dim, seed):
+    rng = np.random.default_rng(seed)
+    # Clustered vectors so the IVF recall numbers resemble real embedding spaces more than uniform noise would
+    centers = rng.normal(size=(max(1, rows // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=rows)] + 0.3 * rng.normal(size=(rows, dim)).astype(np.float32)
+    metadatas = [{"amount": float(rng.integers(10, 50000)), "channel": ["esewa", "khalti", "bank"][i % 3]} for i in range(rows)]
+    return vectors.astype(np.float32), metadatas
+
+
+def exact_top_k(vectors, queries, k, mask=None):
+    distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(1)[None, :]
+    if mask is not None:
+        distances[:, ~mask] = np.inf
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+async def run_backend(backend, args, vectors, metadatas, queries, where):
+    name = f"bench_{backend}_{int(time.time())}"
+    if backend == "local_ivf":
+        settings.local_index_ivf_min_rows = 0
+        backend = "local"
+    else:
+        settings.local_index_ivf_min_rows = 10**12
+    collection = await open_collection(backend, name)
+
+    start = time.perf_counter()
+    ids = [f"doc_{i}" for i in range(len(vectors))]
+    for offset in range(0, len(vectors), args.batch_size):
+        end = offset + args.batch_size
+        await collection.upsert(
+            ids=ids[offset:end], embeddings=vectors[offset:end].tolist(),
+            documents=[f"Receipt {i}" for i in range(offset, min(end, len(vectors)))], metadatas=metadatas[offset:end],
+        )
+    load_seconds = time.perf_counter() - start
+    # First query pays one-off costs (HNSW load) and starts the background IVF build; keep both out of the numbers
+    await collection.query(query_embeddings=queries[:1].tolist(), n_results=args.top_k)
+    if isinstance(getattr(collection, "collection", None), LocalCollection):
+        await asyncio.to_thread(collection.collection.wait_for_index)
+
+    results = {"load_seconds": round(load_seconds, 3)}
+    mask = np.array([m["channel"] == where["channel"] for m in metadatas])
+    for label, filter_ in (("unfiltered", None), ("filtered", where)):
+        truth = exact_top_k(vectors, queries, args.top_k, mask if filter_ else None)
+        latencies, hits = [], 0
+        wall = time.perf_counter()
+        for query, expected in zip(queries, truth):
+            t = time.perf_counter()
+            response = await collection.query(query_embeddings=[query.tolist()], n_results=args.top_k, where=filter_)
+            latencies.append(time.perf_counter() - t)
+            found = {int(id_.split("_")[1]) for id_ in response["ids"][0]}
+            hits += len(found & set(expected.tolist()))
+        summary = latency_summary(latencies, time.perf_counter() - wall)
+        summary[f"recall_at_{args.top_k}"] = round(hits / (len(queries) * args.top_k), 4)
+        results[label] = summary
+    return results
+
+
+async def main_async(args):
+    vectors, metadatas = synthetic_collection(args.rows, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(len(vectors), size=args.queries)] + 0.1 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    where = {"channel": "esewa"}
+    results = {}
+    for backend in args.backends:
+        try:
+            results[backend] = await run_backend(backend, args, vectors, metadatas, queries, where)
+        except Exception as e:
+            results[backend] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency and recall of each vector store backend on a synthetic collection.")
+    parser.add_argument("--backends", nargs="+", default=["persistent", "local", "local_ivf"], choices=BACKENDS,
+                        help="http needs a running Chroma server at CHROMA_HOST:CHROMA_PORT.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file as well.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        settings.vector_store_path = workdir
+        results = asyncio.run(main_async(args))
+    write_report("vector_store", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def latency_summary(latencies_s: list[float], wall_s: float, errors: int = 0) -> dict:
+    samples = np.asarray(latencies_s) * 1000
+    return {
+        "requests": len(latencies_s) + errors,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(samples, 50)), 3) if len(samples) else None,
+        "p95_ms": round(float(np.percentile(samples, 95)), 3) if len(samples) else None,
+        "p99_ms": round(float(np.percentile(samples, 99)), 3) if len(samples) else None,
+        "mean_ms": round(float(samples.mean()), 3) if len(samples) else None,
+        "throughput_rps": round(len(latencies_s) / wall_s, 3) if wall_s else None,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_report(name: str, config: dict, results, output: str = None):
+    # Same envelope for every benchmark so runs from different commits can be diffed directly
+    report = {
+        "benchmark": name,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return report
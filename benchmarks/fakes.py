@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+
+
+def deterministic_vector(text: str, dim: int) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeOllama:
+    """Stand-in for the Ollama server: deterministic embeddings and canned generations with set latencies."""
+
+    def __init__(self, embed_latency_ms=20.0, embed_per_item_ms=2.0, generate_latency_ms=500.0,
+                 ttft_ms=150.0, tokens=40, dim=1024):
+        self.embed_latency = embed_latency_ms / 1000
+        self.embed_per_item = embed_per_item_ms / 1000
+        self.generate_latency = generate_latency_ms / 1000
+        self.ttft = ttft_ms / 1000
+        self.tokens = tokens
+        self.dim = dim
+        self.embed_calls = 0
+        self.embed_inputs = 0
+        self.generate_calls = 0
+
+    def _embed_response(self, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.embed_calls += 1
+        self.embed_inputs += len(texts)
+        return texts, {"embeddings": [deterministic_vector(text, self.dim) for text in texts]}
+
+    def _generate_response(self, prompt):
+        self.generate_calls += 1
+        return {
+            "response": " ".join(f"token{i}" for i in range(self.tokens)),
+            "done": True,
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "eval_count": self.tokens,
+            "eval_duration": int((self.generate_latency - self.ttft) * 1e9),
+        }
+
+    def async_client_class(self):
+        fake = self
+
+        class FakeAsyncClient:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def embed(self, model=None, input=None, **kwargs):
+                texts, response = fake._embed_response(input)
+                await asyncio.sleep(fake.embed_latency + fake.embed_per_item * len(texts))
+                return response
+
+            async def generate(self, model=None, prompt="", stream=False, **kwargs):
+                response = fake._generate_response(prompt)
+                if not stream:
+                    await asyncio.sleep(fake.generate_latency)
+                    return response
+                return fake._stream(response)
+
+            async def chat(self, model=None, messages=None, **kwargs):
+                await asyncio.sleep(fake.generate_latency)
+                return {"message": {"content": "{}"}}
+
+        return FakeAsyncClient
+
+    async def _stream(self, response):
+        await asyncio.sleep(self.ttft)
+        per_token = max(0.0, self.generate_latency - self.ttft) / max(1, self.tokens)
+        for i in range(self.tokens):
+            yield {"response": f"token{i} ", "done": False}
+            await asyncio.sleep(per_token)
+        yield {**response, "response": ""}
+
+    def embed(self, model=None, input=None, **kwargs):
+        texts, response = self._embed_response(input)
+        time.sleep(self.embed_latency + self.embed_per_item * len(texts))
+        return response
+
+    def generate(self, model=None, prompt="", **kwargs):
+        time.sleep(self.generate_latency)
+        return self._generate_response(prompt)
+
+    def install(self):
+        import ollama
+        ollama.AsyncClient = self.async_client_class()
+        ollama.embed = self.embed
+        ollama.generate = self.generate
+
+
+class _AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+
+class _AsyncClient:
+    def __init__(self, client):
+        self._client = client
+
+    async def get_or_create_collection(self, name, **kwargs):
+        return _AsyncCollection(await asyncio.to_thread(self._client.get_or_create_collection, name, **kwargs))
+
+    async def get_collection(self, name, **kwargs):
+        return _AsyncCollection(await asyncio.to_thread(self._client.get_collection, name, **kwargs))
+
+
+class InProcessChroma:
+    """Serves chromadb.AsyncHttpClient from an in-memory EphemeralClient, so no Chroma server is needed."""
+
+    def __init__(self):
+        import chromadb
+        from chromadb.config import Settings
+        self.client = chromadb.EphemeralClient(Settings(anonymized_telemetry=False, allow_reset=True))
+        self.client.reset()
+
+    async def async_http_client(self, *args, **kwargs):
+        return _AsyncClient(self.client)
+
+    def install(self):
+        import chromadb
+        chromadb.AsyncHttpClient = self.async_http_client
+
+
+class FakeOCRKVPExtractor:
+    """Replaces the Surya-backed extractor with a fixed receipt and a configurable inference latency."""
+
+    def __init__(self, latency_ms=800.0):
+        self.latency = latency_ms / 1000
+
+    def _kvp(self, name):
+        from datetime import datetime
+        seed = int(hashlib.sha256(str(name).encode("utf-8")).hexdigest()[:6], 16)
+        return {
+            "Description": "Fund Transfer to Wallet",
+            "Reference Code": seed,
+            "Date/Time": datetime(2025, 1 + seed % 12, 1 + seed % 28, 10, 30),
+            "Channel": "App",
+            "Amount (NPR)": float(seed % 5000),
+            "Receiver Name": f"Merchant {seed % 7}",
+            "Status": "COMPLETE",
+        }
+
+    def ocr_kvp_extraction_with_layout(self, image_path=None, image=None):
+        time.sleep(self.latency)
+        return self._kvp(image_path if image is None else len(image))
+
+    def ocr_kvp_extraction_batch(self, sources, names=None):
+        time.sleep(self.latency * max(1, len(sources)) * 0.5)
+        names = names if names is not None else [str(source) for source in sources]
+        return [{"image_path": name, "kvp_extraction": self._kvp(name), "error": None} for name in names]
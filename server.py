@@ -1,11 +1,39 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, HTTPException, Request, UploadFile
+from typing import List
+from pydantic import ValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import asyncio
+import json
+from src.config import settings
 from src.core.pipeline import RAGPipeline
-from src.ocr.kvp_extract import OCRKVPExtractor
-from src.models.base import QueryRequest, QueryResponse, DocumentAddRequest, DocumentAddResponse, OCRKVPResponse, OCRKVPRequest
+from src.core.concurrency import limits
+from src.core.telemetry import telemetry
+from src.core.embedding_cache import embedding_cache_stats
+from src.core.ingest import BulkIngestError, BulkIngestor, iter_ndjson_documents
+from src.core.metadata import kvp_to_metadata
+from src.core.job_queue import JobQueue, JobWorkerPool, QueueFullError
+from src.models.base import QueryRequest, QueryResponse, QueryBatchRequest, QueryBatchResponse, DocumentAddRequest, DocumentAddResponse, BulkIngestResponse, OCRKVPResponse, OCRKVPRequest, OCRKVPBatchRequest, OCRKVPBatchResponse, JobSubmitResponse, JobStatusResponse
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
 
-app = FastAPI(title="RAG API with Classes & Pydantic")
+
+def serves(role: str):
+    return settings.server_role in (role, "all")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if serves("ocr"):
+        if settings.ocr_warmup:
+            await limits.run_ocr(model_registry.warmup)
+        job_workers.start()
+    yield
+    if serves("ocr"):
+        await job_workers.stop()
+    limits.ocr_executor.shutdown(wait=False)
+
+
+app = FastAPI(title="RAG API with Classes & Pydantic", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,32 +42,176 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+telemetry.setup(app)
+
+query_router = APIRouter()
+ingest_router = APIRouter()
+ocr_router = APIRouter()
 
 pipeline = RAGPipeline()
-ocr_kvp=OCRKVPExtractor()
+bulk_ingestor = BulkIngestor(pipeline.db_client)
+ocr_kvp = None
+job_queue = None
+job_workers = None
+if serves("ocr"):
+    # The OCR stack (torch, Surya) is only imported by replicas that serve OCR
+    from src.core.model_registry import model_registry
+    from src.ocr.kvp_extract import OCRKVPExtractor
+    from src.ocr.templates import template_registry
+    from src.ocr.result_cache import layout_templates, ocr_result_cache
+    ocr_kvp = OCRKVPExtractor()
+
+
+async def run_ocr_kvp_job(job_id: str, payload: dict):
+    kvp_extract = await limits.run_ocr(ocr_kvp.ocr_kvp_extraction_with_layout, image_path=payload["image_path"])
+    result = {"kvp_extraction": kvp_extract}
+    if payload.get("add_docs", True) and kvp_extract:
+        document = [{"content": str(kvp_extract), "metadata": kvp_to_metadata(kvp_extract)}]
+        result["add_docs"] = (await add_docs(DocumentAddRequest(documents=document))).model_dump()
+    return result
+
 
-@app.post("/query", response_model=QueryResponse)
+if serves("ocr"):
+    job_queue = JobQueue()
+    job_workers = JobWorkerPool(job_queue, handlers={"ocr_kvp": run_ocr_kvp_job})
+
+@query_router.post("/query", response_model=QueryResponse)
 async def query_rag(req: QueryRequest):
-    context, answer = pipeline.run(req.prompt)
-    return QueryResponse(source_documents=context, response=answer)
+    context, answer, cache_hit = await pipeline.run(req.prompt, req.top_k)
+    return QueryResponse(source_documents=context, response=answer, cache_hit=cache_hit)
+
+@query_router.post("/query_batch", response_model=QueryBatchResponse)
+async def query_rag_batch(req: QueryBatchRequest):
+    return QueryBatchResponse(results=await pipeline.run_batch(req.prompts, req.top_k))
 
-@app.post("/add_docs", response_model=DocumentAddResponse)
+@query_router.post("/query/stream")
+async def query_rag_stream(req: QueryRequest):
+    async def events():
+        try:
+            async for event in pipeline.run_stream(req.prompt, req.top_k):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            # Failures after the response has started can only be reported as a final event
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@ingest_router.post("/add_docs", response_model=DocumentAddResponse)
 async def add_docs(req: DocumentAddRequest):
-    count = pipeline.db_client.add_documents(req.documents)
-    return DocumentAddResponse(status="success", count=count)
+    counts = await pipeline.db_client.add_documents(req.documents)
+    return DocumentAddResponse(status="success", count=counts["new"] + counts["updated"], **counts)
 
-@app.post("/ocr_kvp",response_model=OCRKVPResponse)
-async def ocr_kvp_extraction(req: OCRKVPRequest):
-    kvp_extract = ocr_kvp.ocr_kvp_extraction_with_layout(image_path=req.image_path)
-    return {"kvp_extraction": kvp_extract}
+@ingest_router.post("/add_docs/bulk", response_model=BulkIngestResponse)
+async def add_docs_bulk(request: Request):
+    # Body is NDJSON, one Document per line, consumed as it streams in
+    try:
+        result = await bulk_ingestor.ingest(iter_ndjson_documents(request.stream()))
+    except BulkIngestError as e:
+        if not isinstance(e.__cause__, ValidationError):
+            raise
+        # Earlier batches were written; report them so the client can resume rather than resend everything
+        raise HTTPException(status_code=400, detail={"error": f"Invalid document line: {e}", "written": e.result})
+    return BulkIngestResponse(**result)
 
-@app.post("/ocr_kvp_add_docs",response_model=OCRKVPResponse)
-async def ocr_kvp_extraction_add_docs(req: OCRKVPRequest):
-    upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    kvp_extract = ocr_kvp.ocr_kvp_extraction_with_layout(image_path=req.image_path)
+async def ocr_kvp_add(kvp_extract):
+    # No id: the content hash becomes the id, so re-uploading a receipt does not duplicate it
     kvp_input=str(kvp_extract)
-    document = [{"id": "kvp_" + upload_time, "content": kvp_input}]
+    document = [{"content": kvp_input, "metadata": kvp_to_metadata(kvp_extract)}]
     if kvp_extract:
         add_docs_response = await add_docs(DocumentAddRequest(documents=document))
         return {"kvp_extraction": kvp_extract, "add_docs": add_docs_response}
-    return {"kvp_extraction": kvp_extract}
\ No newline at end of file
+    return {"kvp_extraction": kvp_extract}
+
+async def ocr_kvp_batch_add(sources, names, ingest: bool):
+    results = await limits.run_ocr(ocr_kvp.ocr_kvp_extraction_batch, sources, names)
+    documents = [
+        {
+            "content": str(result["kvp_extraction"]),
+            "metadata": kvp_to_metadata(result["kvp_extraction"]),
+        }
+        for result in results
+        if result["kvp_extraction"]
+    ]
+    add_docs_response = None
+    if ingest and documents:
+        add_docs_response = await add_docs(DocumentAddRequest(documents=documents))
+    return OCRKVPBatchResponse(results=results, add_docs=add_docs_response)
+
+@ocr_router.post("/ocr_kvp",response_model=OCRKVPResponse)
+async def ocr_kvp_extraction(req: OCRKVPRequest):
+    kvp_extract = await limits.run_ocr(ocr_kvp.ocr_kvp_extraction_with_layout, image_path=req.image_path)
+    return {"kvp_extraction": kvp_extract}
+
+@ocr_router.post("/ocr_kvp/upload",response_model=OCRKVPResponse)
+async def ocr_kvp_extraction_upload(file: UploadFile):
+    # The upload is decoded once inside the OCR worker; nothing is written to disk
+    kvp_extract = await limits.run_ocr(ocr_kvp.ocr_kvp_extraction_with_layout, image=await file.read())
+    return {"kvp_extraction": kvp_extract}
+
+@ocr_router.post("/ocr_kvp_add_docs",response_model=OCRKVPResponse)
+async def ocr_kvp_extraction_add_docs(req: OCRKVPRequest):
+    kvp_extract = await limits.run_ocr(ocr_kvp.ocr_kvp_extraction_with_layout, image_path=req.image_path)
+    return await ocr_kvp_add(kvp_extract)
+
+@ocr_router.post("/ocr_kvp_add_docs/upload",response_model=OCRKVPResponse)
+async def ocr_kvp_extraction_add_docs_upload(file: UploadFile):
+    kvp_extract = await limits.run_ocr(ocr_kvp.ocr_kvp_extraction_with_layout, image=await file.read())
+    return await ocr_kvp_add(kvp_extract)
+
+@ocr_router.post("/ocr_kvp_batch", response_model=OCRKVPBatchResponse)
+async def ocr_kvp_batch(req: OCRKVPBatchRequest):
+    return await ocr_kvp_batch_add(req.image_paths, req.image_paths, req.add_docs)
+
+@ocr_router.post("/ocr_kvp_batch/upload", response_model=OCRKVPBatchResponse)
+async def ocr_kvp_batch_upload(files: List[UploadFile], add_docs: bool = True):
+    sources = [await file.read() for file in files]
+    return await ocr_kvp_batch_add(sources, [file.filename for file in files], add_docs)
+
+@ocr_router.post("/jobs/ocr_kvp", response_model=JobSubmitResponse)
+async def submit_ocr_kvp_job(req: OCRKVPRequest, ingest: bool = True):
+    try:
+        job_id = await asyncio.to_thread(job_queue.submit, "ocr_kvp", {"image_path": req.image_path, "add_docs": ingest})
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    job_workers.notify()
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+@ocr_router.get("/jobs/stats")
+async def job_stats():
+    return await asyncio.to_thread(job_queue.stats)
+
+@ocr_router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JobStatusResponse(job_id=job["id"], **{k: v for k, v in job.items() if k not in ("id", "payload")})
+
+@app.get("/stats")
+async def stats():
+    result = {
+        "role": settings.server_role,
+        "embedding_cache": embedding_cache_stats(),
+        "streaming": pipeline.stream_stats(),
+        "answer_cache": pipeline.answer_cache_stats(),
+        "coalescer": pipeline.retriever.coalescer_stats(),
+    }
+    if serves("ocr"):
+        result.update(
+            models=model_registry.stats(),
+            jobs=await asyncio.to_thread(job_queue.stats),
+            kvp_templates=template_registry.stats(),
+            ocr_cache=ocr_result_cache.stats(),
+            layout_templates=layout_templates.stats(),
+        )
+    return result
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+if serves("query"):
+    app.include_router(query_router)
+if serves("ingest"):
+    app.include_router(ingest_router)
+if serves("ocr"):
+    app.include_router(ocr_router)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,9 +8,77 @@ class Settings(BaseSettings):
     database_name: str = "finance_db"
     chroma_port: int=8003
     chroma_host:str = "localhost"
+    # http: the Chroma server, persistent: embedded Chroma on disk, local: in-process memory-mapped index
+    vector_backend: Literal["http", "persistent", "local"] = "http"
+    vector_store_path: str = "./cache/vectors"
+    local_index_ivf_min_rows: int = 50000
+    local_index_nprobe: int = 8
     ollama_model_name:str ="deepseek-r1:8b"
     embed_model_name:str ="mxbai-embed-large"
+    # Which routes this replica mounts: query, ingest (text documents), ocr (OCR endpoints and jobs) or all
+    server_role: Literal["query", "ingest", "ocr", "all"] = "all"
+    ollama_num_ctx: int = 4096
+    ollama_keep_alive: str = "30m"
+    context_token_budget: int = 2048
+    context_dedup_threshold: float = 0.9
+    embed_cache_enabled: bool = True
+    embed_cache_size: int = 10000
+    embed_cache_path: str = "./cache/embeddings.sqlite"
+
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95
+    answer_cache_ttl_seconds: float = 3600
+    answer_cache_size: int = 512
+    # Query-role replicas never see writes made by ingest/ocr replicas, so they re-read merchant names on a timer
+    merchant_refresh_seconds: float = 60
+
+    coalesce_enabled: bool = True
+    coalesce_window_ms: float = 3
+    coalesce_max_batch_size: int = 32
+
+    embed_concurrency: int = 8
+    generate_concurrency: int = 2
+    chroma_concurrency: int = 16
+    ocr_concurrency: int = 2
+    ocr_max_workers: int = 2
+
+    ingest_batch_size: int = 64
+    ingest_max_in_flight: int = 4
+    ingest_chunk_size: int = 1000
+    ingest_chunk_overlap: int = 200
+
+    telemetry_metrics_enabled: bool = True
+    telemetry_tracing_enabled: bool = False
+    telemetry_service_name: str = "rag-server"
+    telemetry_otlp_endpoint: str = "localhost:4317"
+
+    job_db_path: str = "./cache/jobs.sqlite"
+    job_workers: int = 2
+    job_max_queue_depth: int = 1000
+    job_max_retries: int = 3
+    job_poll_interval: float = 0.5
 
     ocr_model_path: str = "../fintuned_models/fine"
+    ocr_max_image_side: int | None = None
+    ocr_warmup: bool = True
+    template_min_confidence: float = 0.9
+    ocr_warmup_finetuned: bool = False
+    ocr_batched_recognition: bool = True
+    ocr_skip_crop_detection: bool = False
+    ocr_recognition_batch_size: int = 32
+    ocr_detection_batch_size: int = 8
+    ocr_cache_enabled: bool = True
+    ocr_cache_size: int = 256
+    # Reuse merged boxes for images matching an earlier layout (same size, similar ink profile)
+    ocr_layout_template_mode: bool = False
+    ocr_layout_template_threshold: float = 0.97
+    # CPU inference mode; the switches below only apply when it is on
+    ocr_cpu_mode: bool = False
+    ocr_cpu_threads: int | None = None
+    ocr_cpu_interop_threads: int | None = None
+    # Dynamic int8 for every recognition model (/ocr_kvp* and extract_text); the layout model stays unquantized
+    ocr_quantize_int8: bool = False
+    ocr_bf16: bool = False
+    ocr_compile: bool = False
 
 settings = Settings()
\ No newline at end of file
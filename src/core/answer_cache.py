@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import settings
+
+
+class SemanticAnswerCache:
+    """Answers keyed by prompt embedding, returned for later prompts above a cosine-similarity threshold."""
+
+    def __init__(self, threshold: float = None, ttl_seconds: float = None, max_entries: int = None):
+        self.threshold = settings.answer_cache_threshold if threshold is None else threshold
+        self.ttl_seconds = settings.answer_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.answer_cache_size if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        # Bumped by clear(); an answer generated against an older generation is never stored
+        self.generation = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector, scope=None):
+        query = self._normalize(vector)
+        with self._lock:
+            self._expire()
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[key]["vector"] for key in self._keys])
+                similarities = self._matrix @ query
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    key = self._keys[index]
+                    entry = self._entries[key]
+                    if entry["scope"] == scope:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return entry
+            self.misses += 1
+            return None
+
+    def put(self, vector, answer, sources, scope=None, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_puts += 1
+                return
+            self._entries[self._next_key] = {
+                "vector": self._normalize(vector),
+                "answer": answer,
+                "sources": sources,
+                "scope": scope,
+                "created": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+            self.generation += 1
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry["created"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+
+from ..config import settings
+from .stats import RollingStats
+from .telemetry import telemetry
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+# Per-query slices of a multi-query Chroma result; everything else (e.g. "included") is shared
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings", "uris", "data")
+
+telemetry.register("rag_coalescer_batch_size", "Requests merged into one embed or search call.")
+telemetry.register("rag_coalescer_queue_wait_seconds", "Time a request waited for its micro-batch to dispatch.")
+
+
+class MicroBatcher:
+    """Collects items submitted within window_ms (or until max_batch_size) and hands them to handler together.
+
+    handler receives the list of items and returns one result per item, in order.
+    """
+
+    def __init__(self, name: str, handler, window_ms: float, max_batch_size: int):
+        self.name = name
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        # The loop only holds weak references to tasks; keep in-flight batches alive until they finish
+        self._tasks = set()
+        self.batch_size = RollingStats()
+        self.queue_wait_ms = RollingStats()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        now = time.perf_counter()
+        self.batch_size.add(len(batch))
+        telemetry.observe("rag_coalescer_batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS, stage=self.name)
+        for _, _, submitted in batch:
+            self.queue_wait_ms.add((now - submitted) * 1000)
+            telemetry.observe("rag_coalescer_queue_wait_seconds", now - submitted, buckets=QUEUE_WAIT_BUCKETS, stage=self.name)
+        try:
+            results = await self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {"batch_size": self.batch_size.summary(), "queue_wait_ms": self.queue_wait_ms.summary()}
+
+
+class QueryCoalescer:
+    """Merges concurrent queries into one embed call and one Chroma query per (top_k, where) group."""
+
+    def __init__(self, embedder, db_client, window_ms: float = None, max_batch_size: int = None):
+        window_ms = settings.coalesce_window_ms if window_ms is None else window_ms
+        max_batch_size = settings.coalesce_max_batch_size if max_batch_size is None else max_batch_size
+        self.embedder = embedder
+        self.db_client = db_client
+        self.embed_batcher = MicroBatcher("embed", self._embed_batch, window_ms, max_batch_size)
+        self.search_batcher = MicroBatcher("search", self._search_batch, window_ms, max_batch_size)
+
+    async def embed(self, query: str):
+        return [await self.embed_batcher.submit(query)]
+
+    async def search(self, embedding, top_k: int, where: dict = None):
+        return await self.search_batcher.submit((embedding, top_k, where))
+
+    async def _embed_batch(self, queries):
+        return await self.embedder.get_embedding(queries)
+
+    async def _search_batch(self, items):
+        groups = {}
+        for position, (embedding, top_k, where) in enumerate(items):
+            groups.setdefault((top_k, json.dumps(where, sort_keys=True)), []).append(position)
+        results = [None] * len(items)
+
+        async def search_group(top_k, positions):
+            where = items[positions[0]][2]
+            response = await self.db_client.query_records(
+                embeddings=[items[position][0] for position in positions], top_k=top_k, where=where
+            )
+            for offset, position in enumerate(positions):
+                results[position] = {
+                    key: value[offset:offset + 1] if key in RESULT_KEYS and isinstance(value, list) else value
+                    for key, value in response.items()
+                }
+
+        await asyncio.gather(*(search_group(top_k, positions) for (top_k, _), positions in groups.items()))
+        return results
+
+    def stats(self):
+        return {"embed": self.embed_batcher.stats(), "search": self.search_batcher.stats()}
@@ -0,0 +1,30 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ..config import settings
+
+
+class StageLimits:
+    """Per-stage concurrency caps shared by every request on this worker."""
+
+    def __init__(self):
+        self.embed = asyncio.Semaphore(settings.embed_concurrency)
+        self.generate = asyncio.Semaphore(settings.generate_concurrency)
+        self.chroma = asyncio.Semaphore(settings.chroma_concurrency)
+        self.ocr = asyncio.Semaphore(settings.ocr_concurrency)
+        # Threads rather than processes: the Surya models live in the shared model registry and torch
+        # releases the GIL during inference. The registry serialises calls per model, so concurrent OCR
+        # threads overlap across models (layout, detection, recognition) but never share one mid-call.
+        self.ocr_executor = ThreadPoolExecutor(max_workers=settings.ocr_max_workers, thread_name_prefix="ocr")
+
+    async def run_ocr(self, fn, *args, **kwargs):
+        async with self.ocr:
+            loop = asyncio.get_running_loop()
+            # Carry the caller's context so spans opened in the worker nest under the request span
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.ocr_executor, context.run, partial(fn, *args, **kwargs))
+
+
+limits = StageLimits()
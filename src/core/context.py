@@ -0,0 +1,82 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from ..config import settings
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for the English/number-heavy text we index
+    return max(1, (len(text) + 3) // 4)
+
+
+@dataclass
+class ContextChunk:
+    id: str
+    document: str
+    distance: Optional[float]
+    tokens: int
+
+
+class ContextBuilder:
+    """Flattens Chroma query results, drops near-duplicates and packs chunks into a token budget."""
+
+    def __init__(self, token_budget: int = None, dedup_threshold: float = None):
+        self.token_budget = settings.context_token_budget if token_budget is None else token_budget
+        self.dedup_threshold = settings.context_dedup_threshold if dedup_threshold is None else dedup_threshold
+
+    @staticmethod
+    def _shingles(text: str):
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < 3:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+    def flatten(self, results: dict) -> list[ContextChunk]:
+        chunks = []
+        documents = results.get("documents") or []
+        ids = results.get("ids") or [[None] * len(docs) for docs in documents]
+        distances = results.get("distances") or [[None] * len(docs) for docs in documents]
+        for query_ids, query_docs, query_distances in zip(ids, documents, distances):
+            for doc_id, document, distance in zip(query_ids, query_docs, query_distances):
+                if document:
+                    chunks.append(ContextChunk(doc_id, document, distance, estimate_tokens(document)))
+        chunks.sort(key=lambda chunk: float("inf") if chunk.distance is None else chunk.distance)
+        return chunks
+
+    def deduplicate(self, chunks: list[ContextChunk]) -> list[ContextChunk]:
+        kept, kept_shingles, seen_ids = [], [], set()
+        for chunk in chunks:
+            if chunk.id is not None and chunk.id in seen_ids:
+                continue
+            shingles = self._shingles(chunk.document)
+            duplicate = any(
+                len(shingles & other) / len(shingles | other) >= self.dedup_threshold
+                for other in kept_shingles
+            )
+            if duplicate:
+                continue
+            kept.append(chunk)
+            kept_shingles.append(shingles)
+            seen_ids.add(chunk.id)
+        return kept
+
+    def pack(self, chunks: list[ContextChunk]) -> list[ContextChunk]:
+        packed, used = [], 0
+        for chunk in chunks:
+            if used + chunk.tokens <= self.token_budget:
+                packed.append(chunk)
+                used += chunk.tokens
+            elif not packed:
+                # Even the best chunk is over budget on its own; keep a truncated head of it
+                text = chunk.document[:self.token_budget * 4]
+                packed.append(ContextChunk(chunk.id, text, chunk.distance, estimate_tokens(text)))
+                break
+        return packed
+
+    def build(self, results: dict) -> list[ContextChunk]:
+        return self.pack(self.deduplicate(self.flatten(results)))
+
+    @staticmethod
+    def render(chunks: list[ContextChunk]) -> str:
+        return "\n\n".join(chunk.document for chunk in chunks)
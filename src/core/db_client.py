@@ -1,31 +1,111 @@
 from ..config import settings
+from .concurrency import limits
 from .embedder import Embedder
-import chromadb
+from .telemetry import telemetry
+from .vector_store import open_collection
+import asyncio
+import hashlib
+import json
 import ollama
 from typing import List, Optional
 from ..models.base import Document
 
+def content_id(content: str) -> str:
+    return "doc_" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def content_hash(content: str, metadata: dict) -> str:
+    payload = content + "\0" + json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class ChromaClient:
     def __init__(self):
-        self.client = chromadb.HttpClient(host=settings.chroma_host, port=settings.chroma_port)
-        self.collection = self.client.get_or_create_collection(name=settings.collection_name)
+        self.collection = None
+        self._connect_lock = asyncio.Lock()
+        self._change_listeners = []
         self.embedder = Embedder(model_name=settings.embed_model_name)
+
+    def on_change(self, callback):
+        self._change_listeners.append(callback)
+
+    def _notify_change(self):
+        for callback in self._change_listeners:
+            callback()
+
+    async def get_collection(self):
+        if self.collection is None:
+            async with self._connect_lock:
+                if self.collection is None:
+                    self.collection = await open_collection()
+        return self.collection
         
-    def add_documents(self, documents:List[Document])->str:
-        ids = [d.id for d in documents]
-        docs = [d.content for d in documents]
-        metas = [d.metadata for d in documents]
-        embedding= self.embedder.get_embedding(docs)
-        self.collection.add(
-            ids=ids,
-            embeddings=embedding,
-            documents=docs,
-            metadatas=metas if metas else None
-        )
-        return len(docs)
+    async def add_documents(self, documents:List[Document])->dict:
+        # Ids default to a hash of the content, and each record stores a hash of content plus metadata,
+        # so re-ingesting unchanged documents is a single bulk lookup with no embedding or write
+        pending = {}
+        for d in documents:
+            metadata = dict(d.metadata or {})
+            metadata.pop("content_hash", None)
+            metadata["content_hash"] = content_hash(d.content, metadata)
+            pending[d.id or content_id(d.content)] = (d.content, metadata)
+        ids = list(pending)
+        collection = await self.get_collection()
+        with telemetry.stage("chroma.get"):
+            async with limits.chroma:
+                existing = await collection.get(ids=ids, include=["metadatas"])
+        stored = {
+            id_: (metadata or {}).get("content_hash")
+            for id_, metadata in zip(existing["ids"], existing["metadatas"] or [None] * len(existing["ids"]))
+        }
+        counts = {"new": 0, "updated": 0, "skipped": len(documents) - len(ids)}
+        write_ids = []
+        for id_ in ids:
+            if id_ not in stored:
+                counts["new"] += 1
+            elif stored[id_] != pending[id_][1]["content_hash"]:
+                counts["updated"] += 1
+            else:
+                counts["skipped"] += 1
+                continue
+            write_ids.append(id_)
+        if not write_ids:
+            return counts
+
+        docs = [pending[id_][0] for id_ in write_ids]
+        metas = [pending[id_][1] for id_ in write_ids]
+        with telemetry.stage("chroma.embed"):
+            embedding= await self.embedder.get_embedding(docs)
+        with telemetry.stage("chroma.add"):
+            async with limits.chroma:
+                await collection.upsert(
+                    ids=write_ids,
+                    embeddings=embedding,
+                    documents=docs,
+                    metadatas=metas
+                )
+        self._notify_change()
+        return counts
         
-    def query_records(self, embeddings: list, top_k: int):
-        return self.collection.query(
-            query_embeddings=embeddings,
-            n_results=top_k
-        )
\ No newline at end of file
+    async def query_records(self, embeddings: list, top_k: int, where: Optional[dict] = None):
+        collection = await self.get_collection()
+        with telemetry.stage("chroma.query"):
+            async with limits.chroma:
+                return await collection.query(
+                    query_embeddings=embeddings,
+                    n_results=top_k,
+                    where=where
+                )
+
+    async def get_records(self, where: Optional[dict] = None, include: Optional[list] = None, ids: Optional[list] = None):
+        collection = await self.get_collection()
+        with telemetry.stage("chroma.get"):
+            async with limits.chroma:
+                return await collection.get(ids=ids, where=where, include=include or ["metadatas"])
+
+    async def delete_records(self, ids: list):
+        collection = await self.get_collection()
+        with telemetry.stage("chroma.delete"):
+            async with limits.chroma:
+                await collection.delete(ids=ids)
+        self._notify_change()
@@ -1,13 +1,39 @@
 from ..config import settings
+from .concurrency import limits
+from .embedding_cache import get_embedding_cache
+import asyncio
 import ollama
 
 class Embedder:
     def __init__(self, model_name: str = settings.embed_model_name):
         self.model_name = model_name
+        self.client = ollama.AsyncClient()
+        self.cache = get_embedding_cache(model_name) if settings.embed_cache_enabled else None
         
         
-    def get_embedding(self, query:str):
-        response= ollama.embed(model=self.model_name, input=query)
+    async def get_embedding(self, query:str):
+        texts = [query] if isinstance(query, str) else list(query)
+        if self.cache is None:
+            return await self._embed(texts)
+
+        # Only the in-memory tier is touched on the event loop; SQLite reads and commits run in a thread
+        embeddings, missing_hashes = self.cache.get_memory(texts)
+        if missing_hashes:
+            await asyncio.to_thread(self.cache.get_disk, embeddings, missing_hashes)
+        missing = [index for index, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[index] for index in missing))
+            fresh, rows = self.cache.put_memory(unique_texts, await self._embed(unique_texts))
+            if rows:
+                await asyncio.to_thread(self.cache.put_disk, rows)
+            by_text = dict(zip(unique_texts, fresh))
+            for index in missing:
+                embeddings[index] = by_text[texts[index]]
+        return embeddings
+
+    async def _embed(self, texts):
+        async with limits.embed:
+            response = await self.client.embed(model=self.model_name, input=texts)
         if response['embeddings'] is None:
             raise ValueError("Embedding generation failed.")
         return response['embeddings']
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..config import settings
+
+
+class EmbeddingCache:
+    """Two-tier (in-memory LRU over SQLite) cache of embeddings keyed by (model name, content hash).
+
+    The LRU holds float32 arrays (about 4 KB per 1024-d vector rather than ~33 KB as a list of floats);
+    callers get plain lists.
+    """
+
+    def __init__(self, model_name: str, path: str = None, max_entries: int = None):
+        self.model_name = model_name
+        self.max_entries = settings.embed_cache_size if max_entries is None else max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        path = settings.embed_cache_path if path is None else path
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, hash TEXT, vector BLOB, PRIMARY KEY (model, hash))"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+            if row is None or row[0] != model_name:
+                # The configured embed model changed, so every stored vector is stale
+                self._db.execute("DELETE FROM embeddings WHERE model != ?", (model_name,))
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (model_name,))
+            self._db.commit()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: list[str]) -> list:
+        found, missing = self.get_memory(texts)
+        if missing:
+            self.get_disk(found, missing)
+        return found
+
+    def put_many(self, texts: list[str], vectors: list) -> list:
+        stored, rows = self.put_memory(texts, vectors)
+        self.put_disk(rows)
+        return stored
+
+    # The memory tier is cheap enough to use from the event loop; the *_disk halves do SQLite I/O
+    # (including the commit's fsync) and are meant to run in a worker thread
+
+    def get_memory(self, texts: list[str]):
+        """Fills memory hits; returns (found, missing) where missing maps content hash to positions."""
+        found = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for index, text in enumerate(texts):
+                key = self.content_hash(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[index] = vector.tolist()
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key, []).append(index)
+            if self._db is None:
+                self.misses += sum(len(indices) for indices in missing.values())
+        return found, missing
+
+    def get_disk(self, found: list, missing: dict):
+        """Fills found from SQLite for the hashes in missing, in place."""
+        if self._db is None:
+            return
+        keys = list(missing)
+        rows = []
+        with self._db_lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows += self._db.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+        with self._lock:
+            for key, blob in rows:
+                array = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, array)
+                vector = array.tolist()
+                for index in missing[key]:
+                    found[index] = vector
+                    self.disk_hits += 1
+            self.misses += sum(len(indices) for key, indices in missing.items() if found[indices[0]] is None)
+
+    def put_memory(self, texts: list[str], vectors: list):
+        """Stores in the memory tier; returns (stored vectors, rows for put_disk)."""
+        stored = []
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                array = np.asarray(vector, dtype=np.float32)
+                key = self.content_hash(text)
+                self._remember(key, array)
+                rows.append((self.model_name, key, array.tobytes()))
+                stored.append(array.tolist())
+        return stored, rows if self._db is not None else []
+
+    def put_disk(self, rows: list):
+        if self._db is None or not rows:
+            return
+        with self._db_lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+        return _caches[model_name]
+
+
+def embedding_cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
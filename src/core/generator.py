@@ -1,23 +1,62 @@
 from pyexpat.errors import messages
 from ..config import settings
+from .context import estimate_tokens
+from .concurrency import limits
+from .telemetry import telemetry
 import ollama
-from PIL import Image
 from ollama import chat
+from ..ocr.image_io import load_image
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class Generator:
     def __init__(self,gen_model_name:str=settings.ollama_model_name):
         self.gen_model_name = gen_model_name
+        self.client = ollama.AsyncClient()
+        # Keeps the model resident between requests and pins the context window we budget against
+        self.options = {"num_ctx": settings.ollama_num_ctx}
+        self.keep_alive = settings.ollama_keep_alive
         
-    def generate_respose(self,context:str, prompt:str):
-        prompt = f"Context: {context}\n\nQuestion: {prompt}\n\nAnswer:"
-        gen_response=ollama.generate(model=self.gen_model_name, prompt=prompt)
+    def build_prompt(self, context:str, prompt:str):
+        return f"Context: {context}\n\nQuestion: {prompt}\n\nAnswer:"
+
+    async def generate_respose(self,context:str, prompt:str):
+        prompt = self.build_prompt(context=context, prompt=prompt)
+        with telemetry.stage("generator.generate"):
+            async with limits.generate:
+                gen_response = await self.client.generate(
+                    model=self.gen_model_name, prompt=prompt, options=self.options, keep_alive=self.keep_alive
+                )
+        self.log_prompt_tokens(prompt, gen_response)
         # if gen_response['response'] is None:
         #     raise ValueError("Response generation failed.")
         return gen_response['response']
+
+    async def stream_respose(self, context:str, prompt:str):
+        prompt = self.build_prompt(context=context, prompt=prompt)
+        # Timed by hand rather than with a span: the generator is suspended between chunks
+        start = time.perf_counter()
+        async with limits.generate:
+            stream = await self.client.generate(
+                model=self.gen_model_name, prompt=prompt, stream=True, options=self.options, keep_alive=self.keep_alive
+            )
+            async for chunk in stream:
+                if chunk['done']:
+                    self.log_prompt_tokens(prompt, chunk)
+                    telemetry.observe("rag_stage_duration_seconds", time.perf_counter() - start, stage="generator.stream")
+                yield chunk
+
+    def log_prompt_tokens(self, prompt:str, gen_response):
+        logger.info(
+            "prompt tokens: estimated=%d evaluated=%s num_ctx=%d",
+            estimate_tokens(prompt), gen_response.get('prompt_eval_count'), self.options["num_ctx"],
+        )
     
     def ocrimg_kvp_extraction(self,image_path:str):
-        image = Image.open(image_path).convert("RGB")
+        image = load_image(image_path)
         messages = [
         {
                 "role": "user",
@@ -32,7 +71,8 @@ class Generator:
 
     def text_kvp_extraction(self,text:str):
         prompt = f"Extract key-value pairs from the following text of a transaction. Provide the output in JSON format with keys. Provide only the json formatted output.\n\nText: {text}"
-        gen_response=ollama.generate(model=self.gen_model_name, prompt=prompt)
+        with telemetry.stage("generator.kvp_extraction"):
+            gen_response=ollama.generate(model=self.gen_model_name, prompt=prompt, options=self.options, keep_alive=self.keep_alive)
         return gen_response['response']
         
         
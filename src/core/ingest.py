@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import AsyncIterable, AsyncIterator, List
+
+from ..config import settings
+from ..models.base import Document
+from .db_client import ChromaClient, content_id
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    if len(text) <= chunk_size:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        if end < len(text):
+            # Prefer to cut on whitespace in the last quarter of the window
+            cut = text.rfind(" ", start + chunk_size * 3 // 4, end)
+            if cut > start:
+                end = cut
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(start + 1, end - overlap)
+    return chunks
+
+
+async def iter_ndjson_documents(byte_stream: AsyncIterable[bytes]) -> AsyncIterator[Document]:
+    buffer = b""
+    async for piece in byte_stream:
+        buffer += piece
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield Document.model_validate_json(line)
+    if buffer.strip():
+        yield Document.model_validate_json(buffer)
+
+
+class BulkIngestError(Exception):
+    """The upload stream failed part-way; result holds the counts for the batches written before it stopped."""
+
+    def __init__(self, message: str, result: dict):
+        super().__init__(message)
+        self.result = result
+
+
+class BulkIngestor:
+    def __init__(self, db_client: ChromaClient):
+        self.db_client = db_client
+        self.batch_size = settings.ingest_batch_size
+        self.max_in_flight = settings.ingest_max_in_flight
+        self.chunk_size = settings.ingest_chunk_size
+        self.chunk_overlap = settings.ingest_chunk_overlap
+
+    def chunk_document(self, document: Document) -> List[Document]:
+        pieces = chunk_text(document.content, self.chunk_size, self.chunk_overlap)
+        if len(pieces) == 1:
+            return [document]
+        parent_id = document.id or content_id(document.content)
+        return [
+            Document(
+                id=f"{parent_id}#{index}",
+                content=piece,
+                metadata={**(document.metadata or {}), "parent_id": parent_id, "chunk": index, "chunks": len(pieces)},
+            )
+            for index, piece in enumerate(pieces)
+        ]
+
+    async def stale_chunks(self, chunk_counts: dict) -> list:
+        """Ids an earlier ingest of the same documents left behind: chunks past the new count, or the old shape.
+
+        Must run before the new chunks are written, since chunk 0 records the previous chunk count.
+
+        chunk_counts maps each explicit document id to its new number of chunks (1 when stored whole).
+        """
+        probe = [f"{parent_id}#0" for parent_id in chunk_counts]
+        probe += [parent_id for parent_id, chunks in chunk_counts.items() if chunks > 1]
+        existing = await self.db_client.get_records(ids=probe, include=["metadatas"])
+        stale = []
+        for id_, metadata in zip(existing["ids"], existing["metadatas"] or [None] * len(existing["ids"])):
+            if id_ in chunk_counts:
+                # Stored whole before, chunked now
+                stale.append(id_)
+                continue
+            parent_id = id_.rsplit("#", 1)[0]
+            old_chunks = (metadata or {}).get("chunks", 0)
+            # A document now stored whole keeps none of its old chunks
+            first_stale = chunk_counts[parent_id] if chunk_counts[parent_id] > 1 else 0
+            stale.extend(f"{parent_id}#{index}" for index in range(first_stale, old_chunks))
+        return stale
+
+    async def ingest(self, documents: AsyncIterable[Document]):
+        start = time.perf_counter()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = []
+        counts = {"documents": 0, "chunks": 0, "batches": 0, "new": 0, "updated": 0, "skipped": 0, "removed": 0}
+
+        async def write(batch, chunk_counts):
+            try:
+                stale = await self.stale_chunks(chunk_counts) if chunk_counts else []
+                written = await self.db_client.add_documents(batch)
+                for key in ("new", "updated", "skipped"):
+                    counts[key] += written[key]
+                if stale:
+                    await self.db_client.delete_records(stale)
+                    counts["removed"] += len(stale)
+            finally:
+                in_flight.release()
+
+        async def dispatch(batch, chunk_counts):
+            # Waiting here is the backpressure on the upload stream
+            await in_flight.acquire()
+            counts["batches"] += 1
+            tasks.append(asyncio.create_task(write(batch, chunk_counts)))
+
+        batch = []
+        chunk_counts = {}
+        try:
+            async for document in documents:
+                counts["documents"] += 1
+                chunks = self.chunk_document(document)
+                if document.id:
+                    # Content-hash ids never change shape; only caller-chosen ids can leave stale chunks behind
+                    chunk_counts[document.id] = len(chunks)
+                for chunk in chunks:
+                    batch.append(chunk)
+                    counts["chunks"] += 1
+                    if len(batch) >= self.batch_size:
+                        await dispatch(batch, chunk_counts)
+                        batch, chunk_counts = [], {}
+            if batch:
+                await dispatch(batch, chunk_counts)
+        except Exception as e:
+            # A bad line stops the read, but batches already dispatched still land; settle them so the
+            # error can say what was written
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            raise BulkIngestError(str(e), self._summary(counts, results, start)) from e
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return self._summary(counts, results, start)
+
+    @staticmethod
+    def _summary(counts, results, start):
+        failed = [result for result in results if isinstance(result, Exception)]
+        seconds = time.perf_counter() - start
+        return {
+            **counts,
+            "failed_batches": len(failed),
+            "errors": [str(error) for error in failed[:5]],
+            "seconds": round(seconds, 3),
+            "docs_per_sec": round(counts["documents"] / seconds, 2) if seconds else None,
+            "chunks_per_sec": round(counts["chunks"] / seconds, 2) if seconds else None,
+        }
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from ..config import settings
+from .stats import RollingStats
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    """SQLite-backed job queue; jobs survive restarts and are retried up to max_retries times.
+
+    Methods are synchronous and commit (fsync) on every state change; call them from the event loop
+    through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = None, max_depth: int = None, max_retries: int = None):
+        path = settings.job_db_path if path is None else path
+        self.max_depth = settings.job_max_queue_depth if max_depth is None else max_depth
+        self.max_retries = settings.job_max_retries if max_retries is None else max_retries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.queue_wait_seconds = RollingStats()
+        self.run_seconds = RollingStats()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT, payload TEXT, status TEXT, attempts INTEGER DEFAULT 0, "
+                "result TEXT, error TEXT, created REAL, started REAL, finished REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+            # Jobs that were running when the process died go back on the queue
+            self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._db.commit()
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def submit(self, kind: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            depth = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if depth >= self.max_depth:
+                raise QueueFullError(f"Job queue is full ({depth} jobs pending).")
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload), time.time()),
+            )
+            self._db.commit()
+        return job_id
+
+    def claim(self):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            started = time.time()
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ? WHERE id = ?",
+                (started, row["id"]),
+            )
+            self._db.commit()
+        self.queue_wait_seconds.add(started - row["created"])
+        return {"id": row["id"], "kind": row["kind"], "payload": json.loads(row["payload"])}
+
+    def complete(self, job_id: str, result):
+        self._finish(job_id, "done", result=json.dumps(result, default=str))
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            attempts = self._db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if attempts < self.max_retries:
+                self._db.execute("UPDATE jobs SET status = 'queued', error = ? WHERE id = ?", (error, job_id))
+                self._db.commit()
+                return
+        self._finish(job_id, "failed", error=error)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        finished = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                (status, result, error, finished, job_id),
+            )
+            self._db.commit()
+            started = self._db.execute("SELECT started FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        self.run_seconds.add(finished - started)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "depth": counts.get("queued", 0) + counts.get("running", 0),
+            "max_depth": self.max_depth,
+            "by_status": counts,
+            "queue_wait_seconds": self.queue_wait_seconds.summary(),
+            "run_seconds": self.run_seconds.summary(),
+        }
+
+
+class JobWorkerPool:
+    def __init__(self, queue: JobQueue, handlers: dict, workers: int = None, poll_interval: float = None):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = settings.job_workers if workers is None else workers
+        self.poll_interval = settings.job_poll_interval if poll_interval is None else poll_interval
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+            except Exception:
+                # A locked or failing database must not end the worker; back off and poll again
+                logger.exception("claiming a job failed")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                result = await self.handlers[job["kind"]](job["id"], job["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._record(self.queue.fail, job["id"], f"{type(e).__name__}: {e}")
+            else:
+                await self._record(self.queue.complete, job["id"], result)
+
+    async def _record(self, update, job_id, outcome):
+        try:
+            await asyncio.to_thread(update, job_id, outcome)
+        except Exception:
+            # The job stays 'running' and is requeued on the next restart
+            logger.exception("recording the outcome of job %s failed", job_id)
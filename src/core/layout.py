@@ -1,19 +1,19 @@
-from PIL import Image
-from surya.foundation import FoundationPredictor
-from surya.layout import LayoutPredictor
-from surya.recognition import RecognitionPredictor
-from surya.detection import DetectionPredictor
-from surya.settings import settings
+from .model_registry import model_registry
+from ..ocr.image_io import load_image
 
 
 class LayoutAnalyzer:
     
-    def __init__(self):
-        self.model_checkpoint = settings.LAYOUT_MODEL_CHECKPOINT
+    def __init__(self, model_checkpoint: str = None):
+        # None resolves to Surya's default layout checkpoint inside the registry, on first use
+        self.model_checkpoint = model_checkpoint
     
     
     def analyze_layout(self, image_path):
-        image = Image.open(image_path)
-        layout_predictor = LayoutPredictor(FoundationPredictor(checkpoint=self.model_checkpoint))
-        layout_predictions = layout_predictor([image])
+        image = load_image(image_path)
+        return self.analyze_layout_batch([image])
+
+    def analyze_layout_batch(self, images):
+        layout_predictor = model_registry.layout(self.model_checkpoint)
+        layout_predictions = layout_predictor(images)
         return layout_predictions
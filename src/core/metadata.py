@@ -0,0 +1,173 @@
+import calendar
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+KVP_SOURCE = "ocr_kvp"
+
+
+def to_timestamp(value: datetime) -> int:
+    # Receipt times carry no zone, so they are stored and queried as if they were UTC
+    return calendar.timegm(value.timetuple())
+
+
+def kvp_to_metadata(kvp: dict) -> dict:
+    metadata = {"source": KVP_SOURCE}
+    amount = kvp.get("Amount (NPR)")
+    if isinstance(amount, (int, float)):
+        metadata["amount"] = float(amount)
+    date = kvp.get("Date/Time")
+    if isinstance(date, datetime):
+        metadata["timestamp"] = to_timestamp(date)
+        metadata["date"] = date.date().isoformat()
+        metadata["month"] = date.strftime("%Y-%m")
+    receiver = kvp.get("Receiver Name") or kvp.get("Qr Merchant Name")
+    if isinstance(receiver, str) and receiver.strip():
+        metadata["receiver"] = receiver.strip()
+        metadata["receiver_lc"] = receiver.strip().lower()
+    for key, name in (("Channel", "channel"), ("Service Name", "service"), ("Status", "status")):
+        if isinstance(kvp.get(key), str) and kvp[key].strip():
+            metadata[name] = kvp[key].strip()
+    if isinstance(kvp.get("Reference Code"), int):
+        metadata["reference_code"] = kvp["Reference Code"]
+    return metadata
+
+
+MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): index for index, name in enumerate(calendar.month_abbr) if name})
+MONTH_RE = re.compile(r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b(?:\s+(\d{4}))?", re.IGNORECASE)
+ISO_DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+AMOUNT = r"(?:rs\.?|npr)?\s*(\d[\d,]*(?:\.\d+)?)"
+AMOUNT_BETWEEN_RE = re.compile(r"\bbetween\s+" + AMOUNT + r"\s+and\s+" + AMOUNT, re.IGNORECASE)
+AMOUNT_MIN_RE = re.compile(r"(?:\b(?:over|above|more than|greater than|at least)|>=?)\s*" + AMOUNT, re.IGNORECASE)
+AMOUNT_MAX_RE = re.compile(r"(?:\b(?:under|below|less than|at most)|<=?)\s*" + AMOUNT, re.IGNORECASE)
+LAST_DAYS_RE = re.compile(r"\b(?:last|past)\s+(\d+)\s+days\b", re.IGNORECASE)
+AGGREGATE_RES = [
+    ("count", re.compile(r"\b(how many|number of|count)\b", re.IGNORECASE)),
+    ("average", re.compile(r"\b(average|avg|mean)\b", re.IGNORECASE)),
+    ("sum", re.compile(r"\b(total|sum|how much)\b|\bspen[dt]\b", re.IGNORECASE)),
+]
+
+
+@dataclass
+class QueryFilter:
+    where: Optional[dict] = None
+    aggregate: Optional[str] = None
+    description: list[str] = field(default_factory=list)
+
+    def scan_where(self):
+        conditions = [{"source": KVP_SOURCE}]
+        if self.where is not None:
+            conditions.append(self.where)
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class QueryFilterParser:
+    """Turns date ranges, amount bounds and merchant names in a question into a Chroma where clause."""
+
+    def __init__(self):
+        self.merchants = set()
+
+    @property
+    def merchants(self):
+        return self._merchants
+
+    @merchants.setter
+    def merchants(self, names):
+        # Whole-word matches only, longest name first, so "ram" does not match inside "program"
+        self._merchants = {name for name in names if name}
+        alternatives = sorted((re.escape(name) for name in self._merchants), key=len, reverse=True)
+        self._merchant_re = re.compile(r"(?<!\w)(" + "|".join(alternatives) + r")(?!\w)") if alternatives else None
+
+    def parse(self, query: str, now: datetime = None) -> QueryFilter:
+        now = now or datetime.now()
+        conditions = []
+        description = []
+
+        start, end, label = self._date_range(query, now)
+        if start is not None:
+            conditions.append({"timestamp": {"$gte": to_timestamp(start)}})
+            conditions.append({"timestamp": {"$lt": to_timestamp(end)}})
+            description.append(label)
+
+        between = AMOUNT_BETWEEN_RE.search(query)
+        if between:
+            low, high = sorted(float(value.replace(",", "")) for value in between.groups())
+            conditions.append({"amount": {"$gte": low}})
+            conditions.append({"amount": {"$lte": high}})
+            description.append(f"amount between {low:,.2f} and {high:,.2f}")
+        else:
+            minimum = AMOUNT_MIN_RE.search(query)
+            if minimum:
+                conditions.append({"amount": {"$gte": float(minimum.group(1).replace(",", ""))}})
+                description.append(f"amount at least {minimum.group(1)}")
+            maximum = AMOUNT_MAX_RE.search(query)
+            if maximum:
+                conditions.append({"amount": {"$lte": float(maximum.group(1).replace(",", ""))}})
+                description.append(f"amount at most {maximum.group(1)}")
+
+        lowered = query.lower()
+        found = self._merchant_re.findall(lowered) if self._merchant_re is not None else []
+        merchant = max(found, key=len, default=None)
+        if merchant is not None:
+            conditions.append({"receiver_lc": merchant})
+            description.append(f"receiver {merchant}")
+
+        # Only a parsed filter can scope an aggregate; otherwise "how much on groceries" would sum every receipt
+        aggregate = next((name for name, pattern in AGGREGATE_RES if pattern.search(query)), None) if conditions else None
+        where = None
+        if len(conditions) == 1:
+            where = conditions[0]
+        elif conditions:
+            where = {"$and": conditions}
+        return QueryFilter(where=where, aggregate=aggregate, description=description)
+
+    def _date_range(self, query, now):
+        try:
+            return self._parse_date_range(query, now)
+        except (ValueError, OverflowError):
+            # Impossible dates ("2024-02-30") or spans past datetime's range apply no date filter
+            return None, None, None
+
+    def _parse_date_range(self, query, now):
+        lowered = query.lower()
+        today = datetime(now.year, now.month, now.day)
+        if "today" in lowered:
+            return today, today + timedelta(days=1), "today"
+        if "yesterday" in lowered:
+            return today - timedelta(days=1), today, "yesterday"
+        days = LAST_DAYS_RE.search(query)
+        if days:
+            return today - timedelta(days=int(days.group(1)) - 1), today + timedelta(days=1), f"last {days.group(1)} days"
+        if "this month" in lowered:
+            start = datetime(now.year, now.month, 1)
+            return start, self._next_month(start), start.strftime("%B %Y")
+        if "last month" in lowered:
+            end = datetime(now.year, now.month, 1)
+            start = datetime(end.year - 1, 12, 1) if end.month == 1 else datetime(end.year, end.month - 1, 1)
+            return start, end, start.strftime("%B %Y")
+
+        dates = ISO_DATE_RE.findall(query)
+        if len(dates) >= 2:
+            start, end = sorted(datetime.strptime(value, "%Y-%m-%d") for value in dates[:2])
+            return start, end + timedelta(days=1), f"{start.date()} to {end.date()}"
+        if len(dates) == 1:
+            start = datetime.strptime(dates[0], "%Y-%m-%d")
+            return start, start + timedelta(days=1), dates[0]
+
+        month = MONTH_RE.search(query)
+        if month:
+            # "may" is also a verb; only trust it with a year or a preposition in front
+            word = month.group(1).lower()
+            before = query[:month.start()].rstrip().lower()
+            if word != "may" or month.group(2) or before.endswith(("in", "of", "during", "for")):
+                index = MONTHS[word]
+                year = int(month.group(2)) if month.group(2) else (now.year if index <= now.month else now.year - 1)
+                start = datetime(year, index, 1)
+                return start, self._next_month(start), start.strftime("%B %Y")
+        return None, None, None
+
+    @staticmethod
+    def _next_month(start):
+        return datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
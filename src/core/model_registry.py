@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+
+from PIL import Image
+
+from ..config import settings
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _physical_cores():
+    cores = psutil.cpu_count(logical=False) if psutil is not None else None
+    return cores or os.cpu_count() or 1
+
+
+def _bf16_supported():
+    import torch
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class SerializedPredictor:
+    """Runs one call at a time into a Surya predictor.
+
+    Predictors keep per-call decoding state on the instance (the foundation model's prompt queue and
+    KV cache), so concurrent OCR threads must not share one mid-call. Attributes pass through.
+    """
+
+    def __init__(self, predictor, lock: threading.Lock):
+        self.predictor = predictor
+        self.lock = lock
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.predictor(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.predictor, name)
+
+
+class ModelRegistry:
+    """Process-wide cache of Surya predictors, each loaded lazily exactly once.
+
+    Predictors are returned wrapped in SerializedPredictor, with one lock per underlying foundation model
+    (and one for detection), so different models still run in parallel on separate OCR threads.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.RLock()
+        self._call_locks = {}
+        self._cpu_configured = False
+
+    def _load(self, key: str, loader):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                model = loader()
+                load_seconds = time.perf_counter() - start
+                rss_after = _rss_bytes()
+                self._models[key] = model
+                self._stats[key] = {
+                    "load_seconds": round(load_seconds, 3),
+                    "rss_after_mb": round(rss_after / 2**20, 1) if rss_after is not None else None,
+                    "rss_delta_mb": round((rss_after - rss_before) / 2**20, 1) if rss_after is not None else None,
+                }
+        return model
+
+    def _call_lock(self, key: str):
+        with self._lock:
+            return self._call_locks.setdefault(key, threading.Lock())
+
+    def configure_cpu(self):
+        """Sizes torch's thread pools to the machine once, before the first model loads."""
+        if self._cpu_configured or not settings.ocr_cpu_mode:
+            return
+        import torch
+        # Each OCR worker thread runs its own intra-op team, so split the physical cores between them
+        intra = settings.ocr_cpu_threads or max(1, _physical_cores() // max(1, settings.ocr_max_workers))
+        torch.set_num_threads(intra)
+        try:
+            torch.set_num_interop_threads(settings.ocr_cpu_interop_threads or 1)
+        except RuntimeError:
+            # Only settable before torch runs its first parallel op
+            logger.warning("inter-op threads already initialised; keeping %d", torch.get_num_interop_threads())
+        self._cpu_configured = True
+        self._stats["cpu"] = {"intra_op_threads": torch.get_num_threads(), "inter_op_threads": torch.get_num_interop_threads()}
+
+    def _foundation_options(self, quantizable: bool):
+        import torch
+        options = {"device": "cpu"}
+        applied = []
+        # Quantization targets the recognition foundations (default and fine-tuned), never layout, whose
+        # box geometry feeds every later stage; it needs the fp32 weights
+        quantize = settings.ocr_quantize_int8 and quantizable
+        if settings.ocr_bf16 and not quantize:
+            if _bf16_supported():
+                options["dtype"] = torch.bfloat16
+                applied.append("bf16")
+            else:
+                logger.warning("bf16 requested but this CPU has no native bf16 support; staying in fp32")
+        return options, quantize, applied
+
+    def _optimize(self, predictor, quantize: bool, applied: list):
+        import torch
+        if quantize:
+            # Dynamic int8 on the Linear layers; activations stay fp32, so no calibration set is needed
+            predictor.model = torch.ao.quantization.quantize_dynamic(predictor.model, {torch.nn.Linear}, dtype=torch.qint8)
+            applied.append("int8_dynamic")
+        if settings.ocr_compile:
+            predictor.model = torch.compile(predictor.model, dynamic=True)
+            applied.append("compile")
+        return predictor
+
+    def foundation(self, checkpoint: str = None, quantizable: bool = True):
+        self.configure_cpu()
+
+        def load():
+            from surya.foundation import FoundationPredictor
+            kwargs = {} if checkpoint is None else {"checkpoint": checkpoint}
+            if not settings.ocr_cpu_mode:
+                return FoundationPredictor(**kwargs)
+            options, quantize, applied = self._foundation_options(quantizable)
+            predictor = self._optimize(FoundationPredictor(**kwargs, **options), quantize, applied)
+            self._stats.setdefault("optimizations", {})[checkpoint or "default"] = applied
+            return predictor
+        return self._load(f"foundation:{checkpoint or 'default'}", load)
+
+    def recognition(self, checkpoint: str = None):
+        foundation_predictor = self.foundation(checkpoint)
+
+        def load():
+            from surya.recognition import RecognitionPredictor
+            return SerializedPredictor(
+                RecognitionPredictor(foundation_predictor), self._call_lock(f"foundation:{checkpoint or 'default'}")
+            )
+        return self._load(f"recognition:{checkpoint or 'default'}", load)
+
+    def detection(self):
+        self.configure_cpu()
+
+        def load():
+            from surya.detection import DetectionPredictor
+            predictor = DetectionPredictor(device="cpu") if settings.ocr_cpu_mode else DetectionPredictor()
+            return SerializedPredictor(predictor, self._call_lock("detection"))
+        return self._load("detection", load)
+
+    def layout(self, checkpoint: str = None):
+        if checkpoint is None:
+            from surya.settings import settings as surya_settings
+            checkpoint = surya_settings.LAYOUT_MODEL_CHECKPOINT
+        foundation_predictor = self.foundation(checkpoint, quantizable=False)
+
+        def load():
+            from surya.layout import LayoutPredictor
+            return SerializedPredictor(LayoutPredictor(foundation_predictor), self._call_lock(f"foundation:{checkpoint}"))
+        return self._load(f"layout:{checkpoint}", load)
+
+    def warmup(self):
+        image = Image.new("RGB", (256, 64), "white")
+        start = time.perf_counter()
+        self.layout()([image])
+        detection_predictor = self.detection()
+        self.recognition()([image], det_predictor=detection_predictor)
+        if settings.ocr_warmup_finetuned:
+            self.recognition(settings.ocr_model_path)([image], det_predictor=detection_predictor)
+        return round(time.perf_counter() - start, 3)
+
+    def stats(self):
+        return {key: dict(value) for key, value in self._stats.items()}
+
+
+model_registry = ModelRegistry()
@@ -3,19 +3,198 @@ from .db_client import ChromaClient
 from ..config import settings
 from .generator import Generator
 from .retriever import Retriever
+from .stats import RollingStats
+from .answer_cache import SemanticAnswerCache
+from .metadata import QueryFilterParser, KVP_SOURCE
+from .context import ContextBuilder
+from .telemetry import telemetry
+import asyncio
+import json
+import time
 
 class RAGPipeline:
     def __init__(self):
-        self.retriever = Retriever()
+        self.db_client = ChromaClient()
+        self.retriever = Retriever(db_client=self.db_client)
         self.generator = Generator()
         self.embedder = Embedder()
-        self.db_client = ChromaClient()
+        self.ttft_ms = RollingStats()
+        self.tokens_per_sec = RollingStats()
+        # A query-only replica is not told about writes made by other replicas, so its answer cache would go stale
+        self.answer_cache = (
+            SemanticAnswerCache() if settings.answer_cache_enabled and settings.server_role != "query" else None
+        )
+        if self.answer_cache is not None:
+            self.db_client.on_change(self.answer_cache.clear)
+        self.context_builder = ContextBuilder()
+        self.filter_parser = QueryFilterParser()
+        self._merchants_stale = True
+        self._merchants_loaded = 0.0
+        self.db_client.on_change(self._mark_merchants_stale)
+
+    def _mark_merchants_stale(self):
+        self._merchants_stale = True
+
+    async def parse_filter(self, query: str):
+        if settings.server_role == "query" and time.monotonic() - self._merchants_loaded > settings.merchant_refresh_seconds:
+            self._merchants_stale = True
+        if self._merchants_stale:
+            self._merchants_stale = False
+            self._merchants_loaded = time.monotonic()
+            records = await self.db_client.get_records(where={"source": KVP_SOURCE}, include=["metadatas"])
+            self.filter_parser.merchants = {
+                metadata["receiver_lc"] for metadata in records["metadatas"] or [] if metadata and metadata.get("receiver_lc")
+            }
+        with telemetry.stage("pipeline.parse_filter"):
+            return self.filter_parser.parse(query)
+
+    async def aggregate(self, query_filter, top_k: int = 5):
+        # Answered from a metadata scan of the matching KVP records; no LLM call
+        with telemetry.stage("pipeline.aggregate"):
+            records = await self.db_client.get_records(where=query_filter.scan_where(), include=["metadatas"])
+        matched = [
+            (id_, metadata["amount"])
+            for id_, metadata in zip(records["ids"], records["metadatas"] or [])
+            if metadata and "amount" in metadata
+        ]
+        amounts = [amount for _, amount in matched]
+        scope = f" ({', '.join(query_filter.description)})" if query_filter.description else ""
+        if not amounts:
+            answer = f"No matching transactions found{scope}."
+        elif query_filter.aggregate == "count":
+            answer = f"{len(amounts)} transactions{scope}."
+        elif query_filter.aggregate == "average":
+            answer = f"Average amount: NPR {sum(amounts) / len(amounts):,.2f} over {len(amounts)} transactions{scope}."
+        else:
+            answer = f"Total amount: NPR {sum(amounts):,.2f} over {len(amounts)} transactions{scope}."
+        # Only the largest top_k matches are returned as sources, not the whole matching archive
+        sample = [id_ for id_, _ in sorted(matched, key=lambda item: item[1], reverse=True)[:top_k]]
+        if not sample:
+            return [], answer
+        with telemetry.stage("pipeline.aggregate"):
+            documents = await self.db_client.get_records(ids=sample, include=["documents"])
+        by_id = dict(zip(documents["ids"], documents["documents"] or []))
+        return [by_id[id_] for id_ in sample if id_ in by_id], answer
 
-    def run(self, query: str, top_k: int = 5):
-        context = self.retriever.retrieve(query=query, top_k=top_k)
-        if not context:
+    async def _cached_answer(self, query: str, scope):
+        if self.answer_cache is None:
+            return None, None, None
+        # Taken before anything is read, so a write during retrieval or generation voids the later put
+        generation = self.answer_cache.generation
+        embedding = await self.retriever.get_embedding(query=query)
+        with telemetry.stage("pipeline.answer_cache"):
+            return embedding, generation, self.answer_cache.lookup(embedding[0], scope=scope)
+
+    async def _retrieve(self, query: str, top_k: int, embedding, where):
+        results = await self.retriever.retrieve(query=query, top_k=top_k, embedding=embedding, where=where)
+        with telemetry.stage("pipeline.context"):
+            chunks = self.context_builder.build(results)
+        if where is not None and not chunks:
+            # The filter matched nothing; fall back to plain similarity search
+            results = await self.retriever.retrieve(query=query, top_k=top_k, embedding=embedding)
+            with telemetry.stage("pipeline.context"):
+                chunks = self.context_builder.build(results)
+        return chunks
+
+    async def run(self, query: str, top_k: int = 5):
+        query_filter = await self.parse_filter(query)
+        if query_filter.aggregate is not None:
+            sources, answer = await self.aggregate(query_filter, top_k)
+            return sources, answer, False
+
+        scope = (top_k, json.dumps(query_filter.where, sort_keys=True))
+        embedding, generation, cached = await self._cached_answer(query, scope)
+        if cached is not None:
+            return cached["sources"], cached["answer"], True
+        chunks = await self._retrieve(query, top_k, embedding, query_filter.where)
+        if not chunks:
             raise ValueError("No context retrieved for the given query.")
-        response = self.generator.generate_respose(context=context, prompt=query)
-        return context[0],response
-    
-    
\ No newline at end of file
+        sources = [chunk.document for chunk in chunks]
+        response = await self.generator.generate_respose(context=self.context_builder.render(chunks), prompt=query)
+        if self.answer_cache is not None:
+            self.answer_cache.put(embedding[0], response, sources, scope=scope, generation=generation)
+        return sources,response,False
+
+    async def run_batch(self, queries: list[str], top_k: int = 5):
+        # Run concurrently so the retriever's coalescer merges their embed and search calls
+        outcomes = await asyncio.gather(*(self.run(query, top_k) for query in queries), return_exceptions=True)
+        results = []
+        for query, outcome in zip(queries, outcomes):
+            if isinstance(outcome, Exception):
+                results.append({"prompt": query, "error": str(outcome)})
+            else:
+                sources, answer, cache_hit = outcome
+                results.append({"prompt": query, "source_documents": sources, "response": answer, "cache_hit": cache_hit})
+        return results
+
+    async def run_stream(self, query: str, top_k: int = 5):
+        start = time.perf_counter()
+        query_filter = await self.parse_filter(query)
+        if query_filter.aggregate is not None:
+            sources, answer = await self.aggregate(query_filter, top_k)
+            yield {"type": "sources", "source_documents": sources, "cache_hit": False}
+            yield {"type": "token", "token": answer}
+            yield {"type": "done", "cache_hit": False, "ttft_ms": None, "tokens_per_sec": None, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            return
+
+        scope = (top_k, json.dumps(query_filter.where, sort_keys=True))
+        embedding, generation, cached = await self._cached_answer(query, scope)
+        if cached is not None:
+            yield {"type": "sources", "source_documents": cached["sources"], "cache_hit": True}
+            yield {"type": "token", "token": cached["answer"]}
+            yield {"type": "done", "cache_hit": True, "ttft_ms": None, "tokens_per_sec": None, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            return
+
+        chunks = await self._retrieve(query, top_k, embedding, query_filter.where)
+        if not chunks:
+            # The 200 and headers are already sent, so failures are reported in-band
+            yield {"type": "error", "message": "No context retrieved for the given query."}
+            return
+        sources = [chunk.document for chunk in chunks]
+        yield {"type": "sources", "source_documents": sources, "cache_hit": False}
+
+        first_token_at = None
+        tokens = 0
+        final = {}
+        answer = []
+        async for chunk in self.generator.stream_respose(context=self.context_builder.render(chunks), prompt=query):
+            if chunk['response']:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens += 1
+                answer.append(chunk['response'])
+                yield {"type": "token", "token": chunk['response']}
+            if chunk['done']:
+                final = chunk
+        end = time.perf_counter()
+        if self.answer_cache is not None:
+            self.answer_cache.put(embedding[0], "".join(answer), sources, scope=scope, generation=generation)
+
+        ttft_ms = (first_token_at - start) * 1000 if first_token_at is not None else None
+        # Prefer Ollama's own decode counters; fall back to wall clock over streamed chunks
+        if final.get('eval_count') and final.get('eval_duration'):
+            tokens = final['eval_count']
+            tokens_per_sec = tokens / (final['eval_duration'] / 1e9)
+        elif first_token_at is not None and end > first_token_at:
+            tokens_per_sec = tokens / (end - first_token_at)
+        else:
+            tokens_per_sec = None
+
+        if ttft_ms is not None:
+            self.ttft_ms.add(ttft_ms)
+        if tokens_per_sec is not None:
+            self.tokens_per_sec.add(tokens_per_sec)
+        yield {
+            "type": "done",
+            "cache_hit": False,
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens_per_sec, 2) if tokens_per_sec is not None else None,
+            "total_ms": round((end - start) * 1000, 1),
+        }
+
+    def answer_cache_stats(self):
+        return self.answer_cache.stats() if self.answer_cache is not None else None
+
+    def stream_stats(self):
+        return {"ttft_ms": self.ttft_ms.summary(), "tokens_per_sec": self.tokens_per_sec.summary()}
@@ -1,21 +1,35 @@
 from .embedder import Embedder
 from .db_client import ChromaClient
+from .coalescer import QueryCoalescer
+from .telemetry import telemetry
 from ..config import settings
 
 
 class Retriever:
-    def __init__(self, embed_model_name:str = settings.embed_model_name):
+    def __init__(self, embed_model_name:str = settings.embed_model_name, db_client: ChromaClient = None):
         self.embed_model_name = embed_model_name
-        self.db_client = ChromaClient()
+        self.db_client = db_client if db_client is not None else ChromaClient()
+        self.embedder = Embedder(model_name=self.embed_model_name)
+        # Concurrent queries share one embed call and one Chroma query per micro-batch
+        self.coalescer = QueryCoalescer(self.embedder, self.db_client) if settings.coalesce_enabled else None
         
-    def get_embedding(self, query:str):
-        embedder=Embedder(model_name=self.embed_model_name)
-        return embedder.get_embedding(query=query)
+    async def get_embedding(self, query:str):
+        with telemetry.stage("retriever.embed"):
+            if self.coalescer is not None:
+                return await self.coalescer.embed(query)
+            return await self.embedder.get_embedding(query=query)
     
-    def retrieve(self, query:str, top_k:int=5):
-        embedding = self.get_embedding(query=query)
-        results = self.db_client.query_records(embeddings=embedding, top_k=top_k)
+    async def retrieve(self, query:str, top_k:int=5, embedding:list=None, where:dict=None):
+        if embedding is None:
+            embedding = await self.get_embedding(query=query)
+        with telemetry.stage("retriever.search"):
+            if self.coalescer is not None:
+                results = await self.coalescer.search(embedding[0], top_k=top_k, where=where)
+            else:
+                results = await self.db_client.query_records(embeddings=embedding, top_k=top_k, where=where)
         if results['documents'] is None:
             raise ValueError("No results retrieved from database.") 
-        return results["documents"]
-        
\ No newline at end of file
+        return results
+
+    def coalescer_stats(self):
+        return self.coalescer.stats() if self.coalescer is not None else None
@@ -0,0 +1,33 @@
+import threading
+from collections import deque
+
+
+class RollingStats:
+    """Keeps the most recent samples of a measurement and summarizes them as percentiles."""
+
+    def __init__(self, maxlen: int = 1000):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count}
+
+        def percentile(q):
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))], 3)
+
+        return {
+            "count": self.count,
+            "mean": round(sum(samples) / len(samples), 3),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
@@ -0,0 +1,124 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+from ..config import settings
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_NULL_STAGE = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, labels: str):
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        wrapped = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{wrapped} {self.sum}")
+        lines.append(f"{name}_count{wrapped} {self.count}")
+        return lines
+
+
+class _Stage:
+    __slots__ = ("telemetry", "name", "span_cm", "start")
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+        self.span_cm = None
+
+    def __enter__(self):
+        if self.telemetry.tracer is not None:
+            self.span_cm = self.telemetry.tracer.start_as_current_span(self.name)
+            self.span_cm.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.telemetry.metrics_enabled:
+            self.telemetry.observe("rag_stage_duration_seconds", time.perf_counter() - self.start, stage=self.name)
+        if self.span_cm is not None:
+            self.span_cm.__exit__(exc_type, exc, tb)
+        return False
+
+
+class Telemetry:
+    """Per-stage spans (OpenTelemetry) and latency histograms (Prometheus text) that cost nothing when off."""
+
+    def __init__(self):
+        self.metrics_enabled = settings.telemetry_metrics_enabled
+        self.tracing_enabled = settings.telemetry_tracing_enabled
+        self.tracer = None
+        self._histograms = {}
+        self._help = {"rag_stage_duration_seconds": "Latency of each pipeline stage in seconds."}
+        self._lock = threading.Lock()
+
+    def setup(self, app=None):
+        if not self.tracing_enabled:
+            return
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": settings.telemetry_service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.telemetry_otlp_endpoint, insecure=True)))
+        trace.set_tracer_provider(provider)
+        self.tracer = trace.get_tracer("rag")
+        if app is not None:
+            FastAPIInstrumentor.instrument_app(app)
+
+    def stage(self, name: str):
+        if self.tracer is None and not self.metrics_enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def register(self, metric: str, help_text: str):
+        self._help[metric] = help_text
+
+    def observe(self, metric: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+        if not self.metrics_enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        histogram.observe(value)
+
+    def render_prometheus(self) -> str:
+        by_metric = {}
+        for (metric, labels), histogram in sorted(self._histograms.items()):
+            by_metric.setdefault(metric, []).append((labels, histogram))
+        lines = []
+        for metric, series in by_metric.items():
+            if metric in self._help:
+                lines.append(f"# HELP {metric} {self._help[metric]}")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, histogram in series:
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                lines.extend(histogram.render(metric, label_text))
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry()
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import time
+
+from ..config import settings
+from .vector_store import BACKENDS, open_collection
+
+
+async def migrate(source: str, target: str, name: str = None, batch_size: int = 500):
+    """Copies ids, embeddings, documents and metadata between backends. Upserts, so reruns are idempotent."""
+    name = name or settings.collection_name
+    source_collection = await open_collection(source, name)
+    target_collection = await open_collection(target, name)
+    total = await source_collection.count()
+    copied = 0
+    start = time.perf_counter()
+    for offset in range(0, total, batch_size):
+        batch = await source_collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+        )
+        if not len(batch["ids"]):
+            break
+        await target_collection.upsert(
+            ids=batch["ids"],
+            embeddings=[list(map(float, vector)) for vector in batch["embeddings"]],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"],
+        )
+        copied += len(batch["ids"])
+        print(f"{copied}/{total} records copied", flush=True)
+    return {
+        "collection": name,
+        "source": source,
+        "target": target,
+        "copied": copied,
+        "target_count": await target_collection.count(),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy a collection between vector store backends.")
+    parser.add_argument("--source", required=True, choices=BACKENDS)
+    parser.add_argument("--target", required=True, choices=BACKENDS)
+    parser.add_argument("--collection", default=settings.collection_name)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("source and target must differ")
+    print(asyncio.run(migrate(args.source, args.target, args.collection, args.batch_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+BACKENDS = ("http", "persistent", "local")
+
+
+def _compare(value, condition):
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = value == operand
+        elif op == "$ne":
+            ok = value != operand
+        elif op == "$gt":
+            ok = value > operand
+        elif op == "$gte":
+            ok = value >= operand
+        elif op == "$lt":
+            ok = value < operand
+        elif op == "$lte":
+            ok = value <= operand
+        elif op == "$in":
+            ok = value in operand
+        elif op == "$nin":
+            ok = value not in operand
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def matches_where(metadata, where: dict):
+    """Evaluates a Chroma metadata filter ($and/$or plus comparison operators) against one record."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            # As in Chroma, a record without the field never matches a filter on it
+            if not metadata or key not in metadata:
+                return False
+            try:
+                if not _compare(metadata[key], condition):
+                    return False
+            except TypeError:
+                return False
+    return True
+
+
+class IVFIndex:
+    """Inverted-file ANN index: k-means coarse quantizer, with each list's vectors packed contiguously."""
+
+    def __init__(self, vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), size=min(len(vectors), nlist * 256), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearest(sample, centroids)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        self.centroids = centroids
+        self.centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        self.trained_rows = len(vectors)
+        self.assign = np.concatenate([self._nearest(vectors[i:i + 8192], centroids) for i in range(0, len(vectors), 8192)])
+        self._pack(vectors)
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        scores = np.asarray(vectors) @ centroids.T - 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+        return scores.argmax(axis=1)
+
+    def _pack(self, vectors):
+        self.order = np.argsort(self.assign, kind="stable")
+        self.bounds = np.searchsorted(self.assign[self.order], np.arange(len(self.centroids) + 1))
+        self.packed = np.ascontiguousarray(vectors[self.order])
+        self.packed_norms = np.einsum("ij,ij->i", self.packed, self.packed)
+
+    def extend(self, vectors: np.ndarray, updated_rows=()):
+        """Returns a new index over vectors with the same centroids; updated and appended rows are reassigned.
+
+        The existing index is left untouched, so searches already running on it stay consistent.
+        """
+        index = object.__new__(IVFIndex)
+        index.centroids = self.centroids
+        index.centroid_norms = self.centroid_norms
+        index.trained_rows = self.trained_rows
+        assign = np.empty(len(vectors), dtype=self.assign.dtype)
+        assign[:len(self.assign)] = self.assign
+        rows = np.array(sorted(set(updated_rows) | set(range(len(self.assign), len(vectors)))), dtype=np.int64)
+        for i in range(0, len(rows), 8192):
+            assign[rows[i:i + 8192]] = self._nearest(vectors[rows[i:i + 8192]], self.centroids)
+        index.assign = assign
+        index._pack(vectors)
+        return index
+
+    def search(self, query: np.ndarray, nprobe: int, k: int):
+        scores = self.centroids @ query - 0.5 * self.centroid_norms
+        probe = np.argpartition(-scores, min(nprobe, len(scores)) - 1)[:nprobe]
+        slices = [np.arange(self.bounds[c], self.bounds[c + 1]) for c in probe]
+        positions = np.concatenate(slices)
+        distances = np.concatenate([
+            self.packed_norms[self.bounds[c]:self.bounds[c + 1]] - 2 * (self.packed[self.bounds[c]:self.bounds[c + 1]] @ query)
+            for c in probe
+        ]) + float(query @ query)
+        k = min(k, len(distances))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), distances[:0]
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        top = top[np.argsort(distances[top], kind="stable")]
+        return self.order[positions[top]], np.maximum(distances[top], 0)
+
+
+class LocalCollection:
+    """In-process collection: float32 vectors in a memory-mapped file, ids/documents/metadata in SQLite.
+
+    Implements the subset of Chroma's synchronous Collection API the app uses, with squared-L2 distances
+    like Chroma's default space. Search is exact unless the collection is large enough for the IVF index.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        self.dir = os.path.join(path, name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.vector_path = os.path.join(self.dir, "vectors.f32")
+        self.compact_path = self.vector_path + ".compact"
+        self.db = sqlite3.connect(os.path.join(self.dir, "rows.sqlite"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS rows (idx INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+        self._finish_compaction()
+        self._lock = threading.RLock()
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        self.ids, self.documents, self.metadatas = [], [], []
+        for _, id_, document, metadata in self.db.execute("SELECT idx, id, document, metadata FROM rows ORDER BY idx"):
+            self.ids.append(id_)
+            self.documents.append(document)
+            self.metadatas.append(json.loads(metadata) if metadata else None)
+        self._reconcile_vectors()
+        self.index_of = {id_: i for i, id_ in enumerate(self.ids)}
+        # The IVF index is built on a background thread; queries use exact search until it matches _version
+        self.ivf = None
+        self._ivf_version = -1
+        self._version = 0
+        self._dirty_rows = set()
+        self._ivf_thread = None
+        # Bumped when rows are renumbered (delete), which invalidates any index built on the old numbering
+        self._epoch = 0
+        self._where_cache = {}
+        self._open_vectors()
+        self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    def _finish_compaction(self):
+        # delete() commits the renumbered rows together with a 'compacting' marker, then swaps in the
+        # compacted vector file; a crash in between is completed here
+        marker = self.db.execute("SELECT value FROM meta WHERE key = 'compacting'").fetchone()
+        if marker is not None:
+            if os.path.exists(self.compact_path):
+                os.replace(self.compact_path, self.vector_path)
+            self.db.execute("DELETE FROM meta WHERE key = 'compacting'")
+            self.db.commit()
+        elif os.path.exists(self.compact_path):
+            # The rows never committed, so the old vector file still matches them
+            os.remove(self.compact_path)
+
+    def _reconcile_vectors(self):
+        row_bytes = (self.dim or 0) * 4
+        expected = len(self.ids) * row_bytes
+        size = os.path.getsize(self.vector_path) if os.path.exists(self.vector_path) else 0
+        if size > expected:
+            # Drop vectors appended by a write whose rows never committed
+            os.truncate(self.vector_path, expected)
+        elif size < expected:
+            # Rows without a stored vector can never be searched; drop them rather than fail to open
+            kept = size // row_bytes
+            logger.warning("%s: %d rows have no stored vector; dropping them", self.name, len(self.ids) - kept)
+            self.db.execute("DELETE FROM rows WHERE idx >= ?", (kept,))
+            self.db.commit()
+            if os.path.exists(self.vector_path):
+                os.truncate(self.vector_path, kept * row_bytes)
+            del self.ids[kept:], self.documents[kept:], self.metadatas[kept:]
+
+    def _open_vectors(self):
+        if self.dim is None or not self.ids:
+            self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+        else:
+            self.vectors = np.memmap(self.vector_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+
+    def count(self):
+        return len(self.ids)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, overwrite=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, overwrite=True)
+
+    def _write(self, ids, embeddings, documents, metadatas, overwrite: bool):
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+
+            new_rows, updated_rows, batch_index = [], [], {}
+            for position, id_ in enumerate(ids):
+                # Later duplicates within one batch win, as with sequential upserts
+                batch_index[id_] = position
+            for id_, position in batch_index.items():
+                if id_ in self.index_of:
+                    if overwrite:
+                        updated_rows.append((self.index_of[id_], position))
+                else:
+                    new_rows.append(position)
+
+            if updated_rows:
+                matrix = np.memmap(self.vector_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.dim))
+                for row, position in updated_rows:
+                    matrix[row] = vectors[position]
+                    self.documents[row] = documents[position]
+                    self.metadatas[row] = metadatas[position]
+                matrix.flush()
+                del matrix
+            if new_rows:
+                with open(self.vector_path, "ab") as f:
+                    vectors[new_rows].tofile(f)
+                for position in new_rows:
+                    self.index_of[ids[position]] = len(self.ids)
+                    self.ids.append(ids[position])
+                    self.documents.append(documents[position])
+                    self.metadatas.append(metadatas[position])
+
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                [
+                    (self.index_of[ids[position]], ids[position], documents[position],
+                     json.dumps(metadatas[position]) if metadatas[position] is not None else None)
+                    for position in [position for _, position in updated_rows] + new_rows
+                ],
+            )
+            self.db.commit()
+
+            self._where_cache.clear()
+            self._open_vectors()
+            norms = self.norms.copy() if updated_rows else self.norms
+            for row, position in updated_rows:
+                norms[row] = float(vectors[position] @ vectors[position])
+            if new_rows:
+                added = vectors[new_rows]
+                norms = np.concatenate([norms, np.einsum("ij,ij->i", added, added)])
+            self.norms = norms
+            self._version += 1
+            self._dirty_rows.update(row for row, _ in updated_rows)
+
+    def delete(self, ids=None, where=None):
+        # Deletes are rare (stale chunks of re-ingested documents), so the store is compacted on each call
+        with self._lock:
+            if ids is not None:
+                drop = {self.index_of[id_] for id_ in ids if id_ in self.index_of}
+                if where:
+                    drop = {row for row in drop if matches_where(self.metadatas[row], where)}
+            elif where:
+                drop = set(self._where_rows(where).tolist())
+            else:
+                return
+            if not drop:
+                return
+            keep = np.array([row for row in range(len(self.ids)) if row not in drop], dtype=np.int64)
+            with open(self.compact_path, "wb") as f:
+                np.asarray(self.vectors[keep], dtype=np.float32).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            ids = [self.ids[row] for row in keep]
+            documents = [self.documents[row] for row in keep]
+            metadatas = [self.metadatas[row] for row in keep]
+            self.db.execute("DELETE FROM rows")
+            self.db.executemany(
+                "INSERT INTO rows VALUES (?, ?, ?, ?)",
+                [
+                    (idx, id_, document, json.dumps(metadata) if metadata is not None else None)
+                    for idx, (id_, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                ],
+            )
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('compacting', '1')")
+            self.db.commit()
+            os.replace(self.compact_path, self.vector_path)
+            self.db.execute("DELETE FROM meta WHERE key = 'compacting'")
+            self.db.commit()
+            self.ids, self.documents, self.metadatas = ids, documents, metadatas
+            self.index_of = {id_: i for i, id_ in enumerate(ids)}
+            self.norms = self.norms[keep]
+            self._open_vectors()
+            self._where_cache.clear()
+            self.ivf, self._dirty_rows = None, set()
+            self._version += 1
+            self._epoch += 1
+
+    def _where_rows(self, where):
+        # Filters repeat across queries (same month, same merchant); results are kept until the next write
+        key = json.dumps(where, sort_keys=True)
+        rows = self._where_cache.get(key)
+        if rows is None:
+            rows = np.array([i for i, metadata in enumerate(self.metadatas) if matches_where(metadata, where)], dtype=np.int64)
+            if len(self._where_cache) >= 64:
+                self._where_cache.pop(next(iter(self._where_cache)))
+            self._where_cache[key] = rows
+        return rows
+
+    def _ivf(self):
+        # Called under the lock; never trains on the query path
+        if len(self.ids) < settings.local_index_ivf_min_rows:
+            return None
+        if self.ivf is not None and self._ivf_version == self._version:
+            return self.ivf
+        if self._ivf_thread is None:
+            self._ivf_thread = threading.Thread(target=self._build_ivf, name=f"ivf-{self.name}", daemon=True)
+            self._ivf_thread.start()
+        return None
+
+    def _build_ivf(self):
+        while True:
+            with self._lock:
+                version, epoch, vectors = self._version, self._epoch, self.vectors
+                base, dirty = self.ivf, self._dirty_rows
+                self._dirty_rows = set()
+            try:
+                if base is None or len(vectors) > 2 * base.trained_rows:
+                    index = IVFIndex(np.asarray(vectors), nlist=max(1, int(np.sqrt(len(vectors)))))
+                else:
+                    index = base.extend(vectors, dirty)
+            except Exception:
+                with self._lock:
+                    self._dirty_rows |= dirty
+                    self._ivf_thread = None
+                raise
+            with self._lock:
+                if epoch != self._epoch:
+                    # Rows were renumbered during the build; start over from scratch
+                    self.ivf, self._dirty_rows = None, set()
+                    continue
+                # Swapped in as one reference; writes made during the build are caught up on the next pass
+                self.ivf, self._ivf_version = index, version
+                if version == self._version:
+                    self._ivf_thread = None
+                    return
+
+    def wait_for_index(self):
+        """Blocks until a background IVF build, if any, has finished."""
+        thread = self._ivf_thread
+        if thread is not None:
+            thread.join()
+
+    @staticmethod
+    def _search(vectors, norms, query, rows, n_results):
+        if rows is not None:
+            vectors, norms = vectors[rows], norms[rows]
+        if len(vectors) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        distances = norms - 2 * np.asarray(vectors @ query) + float(query @ query)
+        k = min(n_results, len(distances))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), distances[:0]
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        top = top[np.argsort(distances[top], kind="stable")]
+        found = top if rows is None else rows[top]
+        return found, np.maximum(distances[top], 0)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        include = include or ["metadatas", "documents", "distances"]
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": None}
+        # Upserts rewrite vector rows, norms and documents in place, so searches hold the lock too; IVF
+        # training, the slow part, runs outside it
+        with self._lock:
+            rows = self._where_rows(where) if where else None
+            ivf = self._ivf() if rows is None else None
+            for query in queries:
+                if ivf is not None:
+                    found, distances = ivf.search(query, settings.local_index_nprobe, n_results)
+                else:
+                    found, distances = self._search(self.vectors, self.norms, query, rows, n_results)
+                results["ids"].append([self.ids[i] for i in found])
+                results["documents"].append([self.documents[i] for i in found])
+                results["metadatas"].append([self.metadatas[i] for i in found])
+                results["distances"].append(distances.tolist())
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        include = include or ["metadatas", "documents"]
+        with self._lock:
+            if ids is not None:
+                rows = [self.index_of[id_] for id_ in ids if id_ in self.index_of]
+                if where:
+                    rows = [row for row in rows if matches_where(self.metadatas[row], where)]
+            elif where:
+                rows = self._where_rows(where).tolist()
+            else:
+                rows = list(range(len(self.ids)))
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            return {
+                "ids": [self.ids[i] for i in rows],
+                "documents": [self.documents[i] for i in rows] if "documents" in include else None,
+                "metadatas": [self.metadatas[i] for i in rows] if "metadatas" in include else None,
+                "embeddings": np.asarray(self.vectors[rows]) if "embeddings" in include else None,
+            }
+
+
+class ThreadedCollection:
+    """Async facade over a synchronous collection (embedded Chroma or LocalCollection)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def count(self):
+        return await asyncio.to_thread(self.collection.count)
+
+    async def add(self, **kwargs):
+        return await asyncio.to_thread(self.collection.add, **kwargs)
+
+    async def upsert(self, **kwargs):
+        return await asyncio.to_thread(self.collection.upsert, **kwargs)
+
+    async def query(self, **kwargs):
+        return await asyncio.to_thread(self.collection.query, **kwargs)
+
+    async def get(self, **kwargs):
+        return await asyncio.to_thread(self.collection.get, **kwargs)
+
+    async def delete(self, **kwargs):
+        return await asyncio.to_thread(self.collection.delete, **kwargs)
+
+
+async def open_collection(backend: str = None, name: str = None):
+    """Returns an async collection with Chroma's add/upsert/query/get/delete/count API for the chosen backend."""
+    backend = backend or settings.vector_backend
+    name = name or settings.collection_name
+    if backend == "http":
+        # Imported on first connect; chromadb is a large share of server start-up time
+        import chromadb
+        client = await chromadb.AsyncHttpClient(host=settings.chroma_host, port=settings.chroma_port)
+        return await client.get_or_create_collection(name=name)
+    if backend == "persistent":
+        import chromadb
+
+        def connect():
+            client = chromadb.PersistentClient(path=os.path.join(settings.vector_store_path, "chroma"))
+            return client.get_or_create_collection(name=name)
+        return ThreadedCollection(await asyncio.to_thread(connect))
+    if backend == "local":
+        path = os.path.join(settings.vector_store_path, "local")
+        return ThreadedCollection(await asyncio.to_thread(LocalCollection, path, name))
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -8,9 +8,24 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     source_documents: Optional[List[str]] = Field(..., description="Optional source documents related to the query.")
     response:str = Field(..., description="The response generated based on the query and retrieved records.")
+    cache_hit: bool = Field(False, description="Whether the answer was served from the semantic answer cache.")
+
+class QueryBatchRequest(BaseModel):
+    prompts: List[str] = Field(..., description="Prompts to answer; retrieval for all of them is micro-batched.")
+    top_k: int = Field(5, description="Number of top records to retrieve per prompt.")
+
+class QueryBatchItem(BaseModel):
+    prompt: str = Field(..., description="The prompt this result answers.")
+    source_documents: Optional[List[str]] = Field(None, description="Source documents used for the answer.")
+    response: Optional[str] = Field(None, description="The generated answer, if the query succeeded.")
+    cache_hit: bool = Field(False, description="Whether the answer was served from the semantic answer cache.")
+    error: Optional[str] = Field(None, description="Error for this prompt, if it failed.")
+
+class QueryBatchResponse(BaseModel):
+    results: List[QueryBatchItem] = Field(..., description="Per-prompt results, in request order.")
 
 class Document(BaseModel):
-    id: str = Field(..., description="Unique identifier for the document.")
+    id: Optional[str] = Field(None, description="Unique identifier for the document. Defaults to a hash of the content.")
     content: str = Field(..., description="The content of the document to be added.")
     metadata: Optional[dict] = Field(None, description="Optional metadata for the document.")
 
@@ -19,10 +34,56 @@ class DocumentAddRequest(BaseModel):
     
 class DocumentAddResponse(BaseModel):
     status: str = Field(..., description="Status of the add record operation.")
-    count: int = Field(..., description="Number of records added successfully.")
+    count: int = Field(..., description="Number of records written (new plus updated).")
+    new: int = Field(0, description="Records that did not exist before.")
+    updated: int = Field(0, description="Existing records whose content or metadata changed.")
+    skipped: int = Field(0, description="Records already stored unchanged; not re-embedded.")
+    
+class BulkIngestResponse(BaseModel):
+    documents: int = Field(..., description="Number of documents read from the upload stream.")
+    chunks: int = Field(..., description="Number of chunks read from the documents.")
+    new: int = Field(0, description="Chunks that did not exist before.")
+    updated: int = Field(0, description="Existing chunks whose content or metadata changed.")
+    skipped: int = Field(0, description="Chunks already stored unchanged; not re-embedded.")
+    removed: int = Field(0, description="Stale chunks deleted because a re-ingested document now has fewer chunks.")
+    batches: int = Field(..., description="Number of add_documents batches dispatched.")
+    failed_batches: int = Field(..., description="Number of batches that failed to embed or write.")
+    errors: List[str] = Field(default_factory=list, description="First few batch errors, if any.")
+    seconds: float = Field(..., description="Wall-clock time of the ingestion.")
+    docs_per_sec: Optional[float] = Field(None, description="Document throughput.")
+    chunks_per_sec: Optional[float] = Field(None, description="Chunk throughput.")
     
 class OCRKVPResponse(BaseModel):
     kvp_extraction: dict = Field(..., description="Key-Value pairs extracted from the OCR process.")
+    add_docs: Optional[DocumentAddResponse] = Field(None, description="Result of ingesting the extraction, if it was added.")
     
 class OCRKVPRequest(BaseModel):
-    image_path: str = Field(..., description="Path to the image for OCR KVP extraction.")
\ No newline at end of file
+    image_path: str = Field(..., description="Path to the image for OCR KVP extraction.")
+
+class OCRKVPBatchRequest(BaseModel):
+    image_paths: List[str] = Field(..., description="Paths to the images for OCR KVP extraction.")
+    add_docs: bool = Field(True, description="Whether to ingest the successful extractions.")
+
+class OCRKVPBatchItem(BaseModel):
+    image_path: str = Field(..., description="Path of the processed image.")
+    kvp_extraction: Optional[dict] = Field(None, description="Key-Value pairs extracted from the image.")
+    error: Optional[str] = Field(None, description="Error for this image, if extraction failed.")
+
+class OCRKVPBatchResponse(BaseModel):
+    results: List[OCRKVPBatchItem] = Field(..., description="Per-image extraction results, in request order.")
+    add_docs: Optional[DocumentAddResponse] = Field(None, description="Result of ingesting the successful extractions.")
+
+class JobSubmitResponse(BaseModel):
+    job_id: str = Field(..., description="Identifier to poll the job status with.")
+    status: str = Field(..., description="Status of the job at submission time.")
+
+class JobStatusResponse(BaseModel):
+    job_id: str = Field(..., description="Identifier of the job.")
+    kind: str = Field(..., description="Kind of work the job performs.")
+    status: str = Field(..., description="One of queued, running, done or failed.")
+    attempts: int = Field(..., description="Number of times the job has been started.")
+    result: Optional[dict] = Field(None, description="Result of the job once done.")
+    error: Optional[str] = Field(None, description="Last error raised by the job, if any.")
+    created: float = Field(..., description="Submission time as a Unix timestamp.")
+    started: Optional[float] = Field(None, description="Start time of the last attempt as a Unix timestamp.")
+    finished: Optional[float] = Field(None, description="Completion time as a Unix timestamp.")
@@ -5,20 +5,16 @@ class OCRBBoxProcessor:
 
     def expand_boxes_y(self, boxes: list[list[float]], y_expand:int =5, x_expand:int =3, img_height:int =None):
 
-        expanded = []
-        for box in boxes:
-            x1, y1, x2, y2 = box
-            new_x1 = max(0, x1 - x_expand)
-            new_x2 = x2 + x_expand
-            new_y1 = max(0, y1 - y_expand)
-            new_y2 = y2 + y_expand
-            
-            if img_height is not None:
-                new_y2 = min(img_height, new_y2)
+        if len(boxes) == 0:
+            return []
+        boxes = np.asarray(boxes, dtype=np.float64)
+        expanded = boxes + np.array([-x_expand, -y_expand, x_expand, y_expand])
+        expanded[:, :2] = np.maximum(expanded[:, :2], 0)
 
-            expanded.append([new_x1, new_y1, new_x2, new_y2])
+        if img_height is not None:
+            expanded[:, 3] = np.minimum(expanded[:, 3], img_height)
 
-        return expanded
+        return expanded.tolist()
 
     def merge_boxes_iterative(self, boxes: list[list[float]], iou_threshold:int =0.5, proximity_threshold:int =2):
 
@@ -67,3 +63,76 @@ class OCRBBoxProcessor:
                 used[i] = True
             boxes = new_boxes
         return boxes
+
+    def merge_boxes_vectorized(self, boxes: list[list[float]], iou_threshold:int =0.5, proximity_threshold:int =2, small_group:int =64):
+        # Produces exactly what merge_boxes_iterative produces. A box can only ever merge with boxes whose
+        # y-range lies within proximity_threshold of its own, so a sorted y-interval sweep splits the page
+        # into independent bands first; each band then runs the same greedy scan with the inner loop over
+        # candidates done in NumPy. Output keeps the iterative order (by first original box of each group).
+        if len(boxes) < small_group:
+            return self.merge_boxes_iterative(boxes, iou_threshold, proximity_threshold)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if iou_threshold < 0:
+            bands = [np.arange(len(boxes))]
+        else:
+            bands = self._y_bands(boxes, proximity_threshold)
+
+        merged, first_index = [], []
+        for band in bands:
+            band_boxes, band_first = self._merge_band(boxes[band], band, iou_threshold, proximity_threshold)
+            merged.extend(band_boxes)
+            first_index.extend(band_first)
+
+        order = np.argsort(first_index, kind="stable")
+        return [merged[k] for k in order]
+
+    @staticmethod
+    def _y_bands(boxes, proximity_threshold):
+        order = np.argsort(boxes[:, 1], kind="stable")
+        reach = np.maximum.accumulate(boxes[order, 3] + max(proximity_threshold, 0))
+        starts = np.flatnonzero(boxes[order[1:], 1] > reach[:-1]) + 1
+        return [np.sort(band) for band in np.split(order, starts)]
+
+    def _merge_band(self, boxes, indices, iou_threshold, proximity_threshold):
+        first = indices.copy()
+        changed = True
+        while changed:
+            changed = False
+            used = np.zeros(len(boxes), dtype=bool)
+            new_boxes, new_first = [], []
+            for i in range(len(boxes)):
+                if used[i]:
+                    continue
+                used[i] = True
+                merged = boxes[i].copy()
+                cursor = i + 1
+                while cursor < len(boxes):
+                    hits = np.flatnonzero(
+                        ~used[cursor:]
+                        & self._merge_predicate(merged, boxes[cursor:], iou_threshold, proximity_threshold)
+                    )
+                    if hits.size == 0:
+                        break
+                    j = cursor + hits[0]
+                    merged[:2] = np.minimum(merged[:2], boxes[j, :2])
+                    merged[2:] = np.maximum(merged[2:], boxes[j, 2:])
+                    used[j] = True
+                    changed = True
+                    cursor = j + 1
+                new_boxes.append(merged)
+                new_first.append(first[i])
+            boxes, first = np.array(new_boxes), np.array(new_first)
+        return boxes.tolist(), first.tolist()
+
+    @staticmethod
+    def _merge_predicate(box, others, iou_threshold, proximity_threshold):
+        inter_w = np.maximum(0, np.minimum(box[2], others[:, 2]) - np.maximum(box[0], others[:, 0]))
+        inter_h = np.maximum(0, np.minimum(box[3], others[:, 3]) - np.maximum(box[1], others[:, 1]))
+        inter = inter_w * inter_h
+        union = (box[2] - box[0]) * (box[3] - box[1]) + (others[:, 2] - others[:, 0]) * (others[:, 3] - others[:, 1]) - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        return (
+            (iou > iou_threshold)
+            | (np.abs(box[1] - others[:, 3]) < proximity_threshold)
+            | (np.abs(box[3] - others[:, 1]) < proximity_threshold)
+        )
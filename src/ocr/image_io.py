@@ -0,0 +1,27 @@
+import io
+
+from PIL import Image
+
+from ..config import settings
+
+
+def load_image(source, max_side: int = None) -> Image.Image:
+    # Decodes a path, raw bytes or an already opened image exactly once into an RGB image that
+    # layout, cropping and recognition all share. Optionally downscales so the longest side is max_side.
+    if isinstance(source, Image.Image):
+        image = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(source))
+    else:
+        image = Image.open(source)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()
+
+    max_side = settings.ocr_max_image_side if max_side is None else max_side
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+    return image
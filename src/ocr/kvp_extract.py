@@ -4,85 +4,146 @@ from ..config import settings
 import ollama
 from ..core.layout import LayoutAnalyzer
 from .bbox import OCRBBoxProcessor
-from .ocrsurya import OCR
+from .templates import template_registry
+from ..core.telemetry import telemetry
 
 import re
-from datetime import datetime
-
+import json
+from .image_io import load_image
+from .result_cache import content_key, layout_fingerprint, layout_templates, ocr_result_cache, read_source
 
-layout=LayoutAnalyzer()
-bbox_processor = OCRBBoxProcessor()
-ocr_text_extractor = OCR()
 
 class OCRKVPExtractor:
     def __init__(self):
         self.generator = Generator()
         self.ocr=OCR()
+        self.layout = LayoutAnalyzer()
+        self.bbox_processor = OCRBBoxProcessor()
         self.gen_model_name = settings.ollama_model_name
     
     def parse_kvp_response(self, structured_result):
-        def extract_value(label, text):
-            match = text.replace(label,"",1)
-            if match:
-                return match
-            return ""
-
-        kvpair = {}
-        
-        if len(structured_result)<11:
-            kvpair['Description'] = structured_result[0]['text']
-            kvpair["Reference Code"] = int(extract_value("Reference Code", structured_result[1]['text']))
-
-            date_str = extract_value("Date/Time", structured_result[2]['text'])[:-1]
-            date_obj = datetime.strptime(date_str, '%d %b %Y,%I:%M %p')
-            kvpair["Date/Time"] = date_obj
+        # Known receipt layouts are parsed by the compiled templates; anything else goes to the LLM
+        lines = [line['text'] for line in structured_result]
+        with telemetry.stage("ocr.template_match"):
+            match = template_registry.match(lines)
+        template_registry.record(match)
+        if match is not None:
+            return match.kvpair
+        return self.parse_llm_response(self.generator.text_kvp_extraction(text="\n".join(lines)))
 
-            kvpair["Channel"] = extract_value("Channel", structured_result[3]['text'])
-            kvpair["Payment Attribute"] = extract_value("Payment Attribute", structured_result[4]['text'])
-            kvpair["Service Name"] = extract_value("Service Name", structured_result[5]['text'])
-            kvpair["Amount (NPR)"] = float(extract_value("Amount (NPR)", structured_result[6]['text']))
-            kvpair["Initiator"] = extract_value("Initiator", structured_result[7]['text'])
-            kvpair["Receiver Name"] = extract_value("Receiver Name", structured_result[8]['text'])
-            kvpair["Status"] = extract_value("Status", structured_result[9 ]['text'])
-        
-        else:
-            kvpair['Description'] = structured_result[0]['text']
-            kvpair["Reference Code"] = int(extract_value("Reference Code", structured_result[1]['text']))
-
-            date_str = extract_value("Date/Time", structured_result[2]['text'])[:-1]
-            date_obj = datetime.strptime(date_str, '%d %b %Y,%I:%M %p')
-            kvpair["Date/Time"] = date_obj
-
-            kvpair["Channel"] = extract_value("Channel", structured_result[3]['text'])
-            kvpair["Payment Attribute"] = extract_value("Payment Attribute", structured_result[4]['text'])
-            kvpair["Service Name"] = extract_value("Service Name", structured_result[5]['text'])
-            kvpair["Amount (NPR)"] = float(extract_value("Amount (NPR)", structured_result[6]['text']))
-            kvpair["Initiator"] = extract_value("Initiator", structured_result[7]['text'])
-            kvpair["Qr Merchant Name"] = extract_value("Qr Merchant Name", structured_result[8]['text'])
-
-            kvpair["Remarks"] = extract_value("Remarks", structured_result[9]['text'])
-            kvpair["Status"] = extract_value("Status", structured_result[10 ]['text'])
-        
-        return kvpair
+    def parse_llm_response(self, response:str):
+        response = re.sub(r"<think>.*?</think>", "", response, flags=re.DOTALL)
+        match = re.search(r"\{.*\}", response, flags=re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group(0))
+            except json.JSONDecodeError:
+                pass
+        return {"raw_response": response.strip()}
 
     def ocr_kvp_extraction(self, image_path:str="/home/sinju/Documents/Money_tracker/tes1.jpg"):
         text=self.ocr.extract_text(image_path=image_path)
-        response = self.generator.text_kvp_extraction(text=text)
-        return response
+        return self.parse_kvp_response([{"text": text}])
     
     def ocr_kvp_extraction_with_model(self, image_path:str="/home/sinju/Documents/Money_tracker/tes1.jpg"):
-        response = self.generator.ocr_kvp_extraction(image_path=image_path)
+        response = self.generator.ocrimg_kvp_extraction(image_path=image_path)
         return response
 
-    def ocr_kvp_extraction_with_layout(self, image_path:str="/home/sinju/Documents/Money_tracker/tes1.jpg"):
-        layout_predictions = layout.analyze_layout(image_path=image_path)
-        boxes = [box.bbox for box in layout_predictions[0].bboxes if box.label == "Text"]
-        merged_boxes = bbox_processor.merge_boxes_iterative(boxes, iou_threshold=0.5, proximity_threshold=20)
-        final_bbox=bbox_processor.expand_boxes_y(merged_boxes, y_expand=6, x_expand=10)
-        output_dict=ocr_text_extractor.ocr_bbox_(image_path=image_path,bboxes=final_bbox)
+    def layout_boxes(self, layout_prediction):
+        return self.merge_text_boxes(self.text_boxes(layout_prediction))
+
+    def text_boxes(self, layout_prediction):
+        return [box.bbox for box in layout_prediction.bboxes if box.label == "Text"]
+
+    def merge_text_boxes(self, boxes):
+        with telemetry.stage("ocr.merge_boxes"):
+            merged_boxes = self.bbox_processor.merge_boxes_vectorized(boxes, iou_threshold=0.5, proximity_threshold=20)
+            return self.bbox_processor.expand_boxes_y(merged_boxes, y_expand=6, x_expand=10)
+
+    def analyze_boxes(self, images):
+        # (text boxes, merged boxes) per image. In template mode an image whose size and coarse layout
+        # match an earlier one reuses its merged boxes and skips the layout model
+        results = [None] * len(images)
+        fingerprints = {}
+        pending = []
+        for index, image in enumerate(images):
+            if settings.ocr_layout_template_mode:
+                fingerprints[index] = layout_fingerprint(image)
+                boxes = layout_templates.match(image, fingerprints[index])
+                if boxes is not None:
+                    results[index] = (None, boxes)
+                    continue
+            pending.append(index)
+        if pending:
+            with telemetry.stage("ocr.layout"):
+                layout_predictions = self.layout.analyze_layout_batch([images[index] for index in pending])
+            for index, prediction in zip(pending, layout_predictions):
+                text_boxes = self.text_boxes(prediction)
+                results[index] = (text_boxes, self.merge_text_boxes(text_boxes))
+                if index in fingerprints:
+                    layout_templates.add(images[index], fingerprints[index], results[index][1])
+        return results
+
+    def ocr_kvp_extraction_with_layout(self, image_path:str="/home/sinju/Documents/Money_tracker/tes1.jpg", image=None):
+        # image may be raw upload bytes or a PIL image; either way it is decoded once and shared.
+        # Resubmitted images are answered from the content-hash cache without layout or recognition
+        source = image if image is not None else image_path
+        with telemetry.stage("ocr.decode"):
+            source = read_source(source)
+            key = content_key(source) if settings.ocr_cache_enabled else None
+        cached = ocr_result_cache.get(key) if key is not None else None
+        if cached is not None:
+            return self.parse_kvp_response(cached["structured_result"])
+        with telemetry.stage("ocr.decode"):
+            image = load_image(source)
+        text_boxes, final_bbox = self.analyze_boxes([image])[0]
+        with telemetry.stage("ocr.recognition"):
+            output_dict=self.ocr.ocr_bbox_batch([(image, final_bbox)])[0]
+        if key is not None:
+            ocr_result_cache.put(key, text_boxes, final_bbox, output_dict)
         kvp_extract = self.parse_kvp_response(output_dict)
         return kvp_extract
 
+    def ocr_kvp_extraction_batch(self, sources:list, names:list[str]=None):
+        # sources are image paths or upload bytes. Layout and recognition each run once across all
+        # uncached images; failures are reported per image
+        names = names if names is not None else [str(source) for source in sources]
+        results = [{"image_path": name, "kvp_extraction": None, "error": None} for name in names]
+        structured_results = {}
+        images = {}
+        keys = {}
+        for index, source in enumerate(sources):
+            try:
+                with telemetry.stage("ocr.decode"):
+                    source = read_source(source)
+                    if settings.ocr_cache_enabled:
+                        keys[index] = content_key(source)
+                        cached = ocr_result_cache.get(keys[index])
+                        if cached is not None:
+                            structured_results[index] = cached["structured_result"]
+                            continue
+                    images[index] = load_image(source)
+            except Exception as e:
+                results[index]["error"] = f"Could not open image: {e}"
+
+        if images:
+            indices = list(images)
+            analyzed = self.analyze_boxes([images[index] for index in indices])
+            items = [(images[index], boxes) for index, (_, boxes) in zip(indices, analyzed)]
+            with telemetry.stage("ocr.recognition"):
+                recognized = self.ocr.ocr_bbox_batch(items)
+            for index, (text_boxes, boxes), structured_result in zip(indices, analyzed, recognized):
+                structured_results[index] = structured_result
+                if index in keys:
+                    ocr_result_cache.put(keys[index], text_boxes, boxes, structured_result)
+
+        for index, structured_result in sorted(structured_results.items()):
+            try:
+                results[index]["kvp_extraction"] = self.parse_kvp_response(structured_result)
+            except Exception as e:
+                results[index]["error"] = f"Could not parse KVP: {e}"
+        return results
+
 # if __name__ == "__main__":
 #     ocr_extractor = OCRKVPExtractor()
 #     result = ocr_extractor.ocr_kvp_extraction_with_layout()
@@ -1,9 +1,15 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Optional, Tuple
-from datasets import load_dataset
+from datasets import Features, Sequence, Value, load_dataset
+import hashlib
+import json
+import logging
+import os
+import time
 import numpy as np
 import torch
+from torch.utils.data import DataLoader
 from transformers import (
     HfArgumentParser,
     TrainingArguments,
@@ -16,26 +22,137 @@ from surya.common.surya.processor.schema import ImageInput, TextInput
 from surya.common.surya.schema import TaskNames
 from surya.common.util import get_top_scripts, SCRIPT_TOKEN_MAPPING
 
+logger = logging.getLogger(__name__)
+
 # Do not change these defaults
 OCR_TASK_NAME = TaskNames.ocr_with_boxes
 OCR_MAX_IMAGE_SIZE = (1024, 512)
+# Bump when _preprocess_example changes so stale caches are not reused
+PREPROCESS_VERSION = 2
+
+PREPROCESSED_FEATURES = Features({
+    "pixels": Sequence(Value("float32")),
+    "shape": Sequence(Value("int32"), length=3),
+    "text": Value("string"),
+    "length": Value("int32"),
+    "valid": Value("bool"),
+})
+
+
+def get_script_text(text: str) -> str:
+    scripts = get_top_scripts(text)
+    return "".join(SCRIPT_TOKEN_MAPPING[script] for script in scripts)
+
+
+def build_ocr_inputs(image: np.ndarray, gt_text: str):
+    return {
+        "task": TaskNames.ocr_with_boxes,
+        "inputs": [
+            ImageInput(type="image", image=image, rotated=False),
+            # This empty TextInput **must be included** to match the original format
+            TextInput(type="text", text=""),
+            TextInput(type="text",text=gt_text),
+        ],
+    }
+
+
+def sequence_length(processor: SuryaOCRProcessor, sample) -> int:
+    # Image plus text tokens, exactly as the collator will see them before padding
+    return int(processor([sample], padding_side="right")["input_ids"].shape[1])
+
+
+def _preprocess_example(example, processor: SuryaOCRProcessor):
+    # Runs once per sample in a datasets.map worker; corrupt samples are flagged and filtered afterwards
+    try:
+        image = np.asarray(example["image"].convert("RGB"), dtype=np.float32)
+        image = processor.scale_to_fit(image, max_size=OCR_MAX_IMAGE_SIZE)
+        gt_text = example["text"]
+        text = get_script_text(gt_text) + gt_text
+        return {
+            "pixels": image.reshape(-1),
+            "shape": list(image.shape),
+            "text": text,
+            "length": sequence_length(processor, build_ocr_inputs(image, text)),
+            "valid": True,
+        }
+    except Exception as e:
+        logger.warning("Dropping corrupt sample: %s", e)
+        return {"pixels": np.zeros(0, dtype=np.float32), "shape": [0, 0, 3], "text": "", "length": 0, "valid": False}
+
+
+def preprocess_cache_key(hf_dataset, processor: SuryaOCRProcessor, model_args: SuryaOCRModelArguments = None):
+    config = {
+        "version": PREPROCESS_VERSION,
+        "dataset": hf_dataset._fingerprint,
+        "max_image_size": OCR_MAX_IMAGE_SIZE,
+        "processor": type(processor).__qualname__,
+        "checkpoint": model_args.pretrained_checkpoint_path if model_args is not None else None,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def preprocess_dataset(hf_dataset, processor: SuryaOCRProcessor, data_args: SuryaOCRDataArguments, model_args: SuryaOCRModelArguments = None):
+    """Decodes, scales and script-tags every sample once into an Arrow cache; later runs memory-map it."""
+    key = preprocess_cache_key(hf_dataset, processor, model_args)
+    cache_dir = os.path.join(data_args.preprocess_cache_dir, key)
+    os.makedirs(cache_dir, exist_ok=True)
+    processed = hf_dataset.map(
+        _preprocess_example,
+        fn_kwargs={"processor": processor},
+        remove_columns=hf_dataset.column_names,
+        features=PREPROCESSED_FEATURES,
+        num_proc=data_args.num_preprocess_proc,
+        cache_file_name=os.path.join(cache_dir, "processed.arrow"),
+        new_fingerprint=f"{key}-processed",
+        desc="Preprocessing OCR samples",
+    )
+    valid = processed.filter(
+        lambda flags: flags,
+        input_columns="valid",
+        batched=True,
+        num_proc=data_args.num_preprocess_proc,
+        cache_file_name=os.path.join(cache_dir, "valid.arrow"),
+        new_fingerprint=f"{key}-valid",
+    )
+    if len(valid) < len(processed):
+        logger.warning("Filtered %d corrupt samples out of %d", len(processed) - len(valid), len(processed))
+    return valid.remove_columns("valid").with_format("numpy", columns=["pixels", "shape"], output_all_columns=True)
+
 
 # Simple wrapper for huggingface dataset
 class SuryaOCRDataset(torch.utils.data.Dataset):
-    def __init__(self, processor: SuryaOCRProcessor, data_args: SuryaOCRDataArguments):
+    def __init__(self, processor: SuryaOCRProcessor, data_args: SuryaOCRDataArguments, model_args: SuryaOCRModelArguments = None):
         super().__init__()
         self.hf_dataset = load_dataset(data_args.dataset_name, num_proc=data_args.num_loading_proc, split="train")
         self.processor = processor
+        self.preprocessed = preprocess_dataset(self.hf_dataset, processor, data_args, model_args) if data_args.preprocess else None
 
     def __len__(self):
+        if self.preprocessed is not None:
+            return len(self.preprocessed)
         return len(self.hf_dataset)
 
     def get_script_text(self, text: str) -> str:
-        scripts = get_top_scripts(text)
-        script_text = "".join(SCRIPT_TOKEN_MAPPING[script] for script in scripts)
-        return script_text
+        return get_script_text(text)
+
+    def build_inputs(self, image: np.ndarray, gt_text: str):
+        return build_ocr_inputs(image, gt_text)
+
+    def lengths(self, max_sequence_length: Optional[int] = None):
+        if self.preprocessed is not None:
+            lengths = np.asarray(self.preprocessed["length"])
+        else:
+            logger.warning("Computing sequence lengths sample by sample; enable --preprocess to cache them")
+            lengths = np.array([sequence_length(self.processor, self[index]) for index in range(len(self))])
+        if max_sequence_length is not None:
+            lengths = np.minimum(lengths, max_sequence_length)
+        return lengths
 
     def __getitem__(self, index):
+        if self.preprocessed is not None:
+            # Pixels come straight out of the memory-mapped Arrow cache, already scaled and script-tagged
+            data = self.preprocessed[index]
+            return self.build_inputs(data["pixels"].reshape(data["shape"]), data["text"])
         try:
             data = self.hf_dataset[index]
             image = data["image"]
@@ -47,16 +164,7 @@ class SuryaOCRDataset(torch.utils.data.Dataset):
             gt_text = data["text"]
             gt_text = self.get_script_text(gt_text) + gt_text
 
-            return_dict = {
-                "task": TaskNames.ocr_with_boxes,
-                "inputs": [
-                    ImageInput(type="image", image=image, rotated=False),
-                    # This empty TextInput **must be included** to match the original format
-                    TextInput(type="text", text=""),
-                    TextInput(type="text",text=gt_text),
-                ],
-            }
-            return return_dict
+            return self.build_inputs(image, gt_text)
         except:
             import traceback; traceback.print_exc()
             return self.__getitem__((index + 1) % self.__len__())
@@ -87,6 +195,134 @@ class SuryaOCRDataCollator:
 
         return processed_batch
 
+class LengthGroupedBatchSampler:
+    """Fixed-size batches of similar length: shuffle, sort within mega-batches, then shuffle the batches."""
+
+    def __init__(self, lengths, batch_size: int, group_size: int = 50, seed: int = 0, drop_last: bool = False):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.group_size = group_size
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def _grouped_indices(self, rng):
+        indices = rng.permutation(len(self.lengths))
+        mega = self.batch_size * self.group_size
+        return [
+            group[np.argsort(-self.lengths[group], kind="stable")]
+            for group in (indices[i:i + mega] for i in range(0, len(indices), mega))
+        ]
+
+    def batches(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        batches = []
+        for group in self._grouped_indices(rng):
+            batches.extend(group[i:i + self.batch_size].tolist() for i in range(0, len(group), self.batch_size))
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches = batches[:-1]
+        return [batches[i] for i in rng.permutation(len(batches))]
+
+    def __iter__(self):
+        return iter(self.batches())
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return -(-len(self.lengths) // self.batch_size)
+
+
+class TokenBudgetBatchSampler(LengthGroupedBatchSampler):
+    """Variable-size batches packed so that batch_size x longest sample stays within max_tokens."""
+
+    def __init__(self, lengths, max_tokens: int, max_batch_size: int = 256, group_size: int = 50, seed: int = 0):
+        super().__init__(lengths, batch_size=max_batch_size, group_size=group_size, seed=seed)
+        self.max_tokens = max_tokens
+        self._len = None
+
+    def batches(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        batches = []
+        for group in self._grouped_indices(rng):
+            batch, longest = [], 0
+            # Sorted longest first, so the first sample of a batch fixes its padded width
+            for index in group.tolist():
+                width = max(longest, int(self.lengths[index]))
+                if batch and (width * (len(batch) + 1) > self.max_tokens or len(batch) >= self.batch_size):
+                    batches.append(batch)
+                    batch, width = [], int(self.lengths[index])
+                batch.append(index)
+                longest = width
+            if batch:
+                batches.append(batch)
+        return [batches[i] for i in rng.permutation(len(batches))]
+
+    def __len__(self):
+        # Batch count varies slightly with the shuffle; the first epoch's count is a close estimate
+        if self._len is None:
+            self._len = len(self.batches())
+        return self._len
+
+
+class SuryaOCRTrainer(Trainer):
+    """Trainer with length-aware batch samplers and padding-efficiency / samples-per-second logging."""
+
+    def __init__(self, *args, data_args: SuryaOCRDataArguments = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.data_args = data_args
+        self._reset_batch_stats()
+
+    def _reset_batch_stats(self):
+        self._samples = 0
+        self._real_tokens = 0
+        self._padded_tokens = 0
+        self._stats_start = time.perf_counter()
+
+    def get_train_dataloader(self):
+        if self.data_args is None or self.data_args.batching == "fixed":
+            return super().get_train_dataloader()
+        lengths = self.train_dataset.lengths(self.data_args.max_sequence_length)
+        if self.data_args.batching == "length_grouped":
+            batch_sampler = LengthGroupedBatchSampler(
+                lengths, self._train_batch_size, group_size=self.data_args.length_group_size,
+                seed=self.args.seed, drop_last=self.args.dataloader_drop_last,
+            )
+        else:
+            batch_sampler = TokenBudgetBatchSampler(
+                lengths, self.data_args.max_tokens_per_batch, max_batch_size=self.data_args.max_batch_size,
+                group_size=self.data_args.length_group_size, seed=self.args.seed,
+            )
+        dataloader = DataLoader(
+            self.train_dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+            persistent_workers=self.args.dataloader_persistent_workers and self.args.dataloader_num_workers > 0,
+        )
+        return self.accelerator.prepare(dataloader)
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        attention_mask = inputs.get("attention_mask")
+        if attention_mask is not None:
+            self._samples += attention_mask.shape[0]
+            self._real_tokens += int(attention_mask.sum())
+            self._padded_tokens += attention_mask.numel()
+        return super().training_step(model, inputs, *args, **kwargs)
+
+    def log(self, logs, *args, **kwargs):
+        elapsed = time.perf_counter() - self._stats_start
+        if self._padded_tokens and "loss" in logs:
+            logs["padding_efficiency"] = round(self._real_tokens / self._padded_tokens, 4)
+            logs["batch_samples_per_second"] = round(self._samples / elapsed, 3)
+            logs["batch_tokens_per_second"] = round(self._real_tokens / elapsed, 1)
+            self._reset_batch_stats()
+        return super().log(logs, *args, **kwargs)
+
+
 def load_model_and_processor(checkpoint_path: Optional[str] = None) -> Tuple[SuryaModel, SuryaOCRProcessor]:
     foundation_predictor = FoundationPredictor(checkpoint=checkpoint_path)
     return foundation_predictor.model, foundation_predictor.processor
@@ -100,6 +336,16 @@ class SuryaOCRDataArguments:
     dataset_name: str = field(default="datalab-to/ocr_finetune_example")
     num_loading_proc: int = field(default=16)
     max_sequence_length: Optional[int] = field(default=None)
+    preprocess: bool = field(default=True, metadata={"help": "Decode and scale images once into an on-disk Arrow cache."})
+    num_preprocess_proc: int = field(default=8)
+    preprocess_cache_dir: str = field(default="./cache/ocr_preprocessed")
+    batching: str = field(
+        default="fixed",
+        metadata={"help": "fixed (per_device_train_batch_size, dataset order), length_grouped or token_budget.", "choices": ["fixed", "length_grouped", "token_budget"]},
+    )
+    length_group_size: int = field(default=50, metadata={"help": "Batches per mega-batch sorted by length."})
+    max_tokens_per_batch: int = field(default=16384, metadata={"help": "Padded token budget per batch in token_budget mode."})
+    max_batch_size: int = field(default=64, metadata={"help": "Upper bound on samples per batch in token_budget mode."})
 
 @dataclass
 class SuryaOCRTrainingArguments(TrainingArguments):
@@ -110,14 +356,15 @@ def main():
     model_args, data_args, training_args = parser.parse_args_into_dataclasses()
 
     model, processor = load_model_and_processor(model_args.pretrained_checkpoint_path)
-    dataset = SuryaOCRDataset(processor, data_args)
+    dataset = SuryaOCRDataset(processor, data_args, model_args)
     collator = SuryaOCRDataCollator(processor, data_args)
 
-    trainer = Trainer(
+    trainer = SuryaOCRTrainer(
         model=model,
         args=training_args,
         train_dataset=dataset,
-        data_collator=collator
+        data_collator=collator,
+        data_args=data_args,
     )
     trainer.train()
 
@@ -129,3 +376,5 @@ if __name__ == "__main__":
 # 24 --num_train_epochs 10
 
 
+# Token-budget batching instead of a fixed batch size (padding_efficiency is logged with the loss):
+# python src/ocr/ocr_finetune.py --output_dir $OUTPUT_DIR --dataset_name $DATASET --batching token_budget --max_tokens_per_batch 16384 --max_sequence_length 1024 --num_train_epochs 10
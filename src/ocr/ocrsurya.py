@@ -1,10 +1,8 @@
 from ..config import settings
 
 
-from PIL import Image
-from surya.foundation import FoundationPredictor
-from surya.recognition import RecognitionPredictor
-from surya.detection import DetectionPredictor
+from ..core.model_registry import model_registry
+from .image_io import load_image
 import re
 
 class OCR:
@@ -15,11 +13,10 @@ class OCR:
         TEST_IMAGE_PATH = image_path
         MODEL_PATH = self.model
 
-        foundation_predictor  = FoundationPredictor(checkpoint=MODEL_PATH)
-        recognition_predictor = RecognitionPredictor(foundation_predictor)
-        detection_predictor = DetectionPredictor()
+        recognition_predictor = model_registry.recognition(MODEL_PATH)
+        detection_predictor = model_registry.detection()
 
-        image = Image.open(TEST_IMAGE_PATH).convert("RGB")
+        image = load_image(TEST_IMAGE_PATH)
         predictions = recognition_predictor([image], det_predictor=detection_predictor)
 
         txt=""
@@ -28,24 +25,52 @@ class OCR:
         return txt
     
     
-    def ocr_bbox_(self, image_path,bboxes):
-        image = Image.open(image_path)
-        structured_result = []
+    def ocr_bbox_(self, image_path,bboxes, batched=None, skip_detection=None):
+        image = load_image(image_path)
+        return self.ocr_bbox_batch([(image, bboxes)], batched=batched, skip_detection=skip_detection)[0]
 
-        foundation_predictor = FoundationPredictor()
-        recognition_predictor = RecognitionPredictor(foundation_predictor)
-        detection_predictor = DetectionPredictor()
+    def ocr_bbox_batch(self, items, batched=None, skip_detection=None):
+        # items is a list of (image, bboxes); one structured_result is returned per image, in box order
+        batched = settings.ocr_batched_recognition if batched is None else batched
+        skip_detection = settings.ocr_skip_crop_detection if skip_detection is None else skip_detection
 
-        for box in bboxes:
-            x1, y1, x2, y2 = box
-            cropped = image.crop((x1, y1, x2, y2))
+        crops = []
+        owners = []
+        for index, (image, bboxes) in enumerate(items):
+            for box in bboxes:
+                x1, y1, x2, y2 = box
+                crops.append(image.crop((x1, y1, x2, y2)))
+                owners.append(index)
 
-            # det = detection_predictor([cropped])
-            rec = recognition_predictor([cropped], det_predictor=detection_predictor)
+        structured_results = [[] for _ in items]
+        if not crops:
+            return structured_results
 
-            text = " ".join([line.text for line in rec[0].text_lines])
-            structured_result.append({
+        if batched:
+            predictions = self._recognize(crops, skip_detection)
+        else:
+            predictions = [self._recognize([cropped], skip_detection)[0] for cropped in crops]
+
+        for owner, rec in zip(owners, predictions):
+            text = " ".join([line.text for line in rec.text_lines])
+            structured_results[owner].append({
                 "text":  re.sub(r'<.*?>', '', text)
             })
-            
-        return structured_result
\ No newline at end of file
+        return structured_results
+
+    def _recognize(self, crops, skip_detection):
+        recognition_predictor = model_registry.recognition()
+        if skip_detection:
+            # Every layout box is already a single line, so hand it to recognition as a full-crop bbox
+            line_bboxes = [[[0, 0, cropped.width, cropped.height]] for cropped in crops]
+            return recognition_predictor(
+                crops,
+                bboxes=line_bboxes,
+                recognition_batch_size=settings.ocr_recognition_batch_size,
+            )
+        return recognition_predictor(
+            crops,
+            det_predictor=model_registry.detection(),
+            detection_batch_size=settings.ocr_detection_batch_size,
+            recognition_batch_size=settings.ocr_recognition_batch_size,
+        )
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from ..config import settings
+
+
+def read_source(source):
+    # Paths are read into bytes once so the same bytes are hashed and decoded
+    if isinstance(source, (bytes, bytearray, memoryview, Image.Image)):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def content_key(source) -> str:
+    if isinstance(source, Image.Image):
+        digest = hashlib.sha256(f"{source.mode}:{source.size}".encode())
+        digest.update(source.tobytes())
+        return digest.hexdigest()
+    return hashlib.sha256(bytes(source)).hexdigest()
+
+
+class OCRResultCache:
+    """LRU of per-image results keyed by content hash: text layout boxes, merged boxes and OCR lines."""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = settings.ocr_cache_size if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, layout_boxes, boxes, structured_result):
+        with self._lock:
+            self._entries[key] = {"layout_boxes": layout_boxes, "boxes": boxes, "structured_result": structured_result}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def layout_fingerprint(image: Image.Image) -> np.ndarray:
+    # Row and column ink profiles of a 32x64 thumbnail: cheap, and stable across receipts that share
+    # a layout but differ in the printed values
+    ink = 255.0 - np.asarray(image.convert("L").resize((32, 64), Image.BILINEAR), dtype=np.float32)
+    profile = np.concatenate([ink.mean(axis=1), ink.mean(axis=0)])
+    profile -= profile.mean()
+    norm = np.linalg.norm(profile)
+    return profile / norm if norm else profile
+
+
+class LayoutTemplateStore:
+    """Merged box sets of previously analysed layouts, reused for images of the same size and coarse layout."""
+
+    def __init__(self, threshold: float = None, per_size: int = 8, max_sizes: int = 64):
+        self.threshold = settings.ocr_layout_template_threshold if threshold is None else threshold
+        self.per_size = per_size
+        self.max_sizes = max_sizes
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, image: Image.Image, fingerprint: np.ndarray):
+        with self._lock:
+            templates = self._templates.get(image.size, [])
+            best, best_score = None, self.threshold
+            for template in templates:
+                score = float(template["fingerprint"] @ fingerprint)
+                if score >= best_score:
+                    best, best_score = template, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._templates.move_to_end(image.size)
+            best["hits"] += 1
+            self.hits += 1
+            return best["boxes"]
+
+    def add(self, image: Image.Image, fingerprint: np.ndarray, boxes):
+        with self._lock:
+            templates = self._templates.setdefault(image.size, [])
+            templates.append({"fingerprint": fingerprint, "boxes": boxes, "hits": 0})
+            if len(templates) > self.per_size:
+                # Evict the least reused older template, never the one just added
+                victim = min(range(len(templates) - 1), key=lambda position: templates[position]["hits"])
+                del templates[victim]
+            self._templates.move_to_end(image.size)
+            while len(self._templates) > self.max_sizes:
+                self._templates.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": settings.ocr_layout_template_mode,
+                "templates": sum(len(templates) for templates in self._templates.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+ocr_result_cache = OCRResultCache()
+layout_templates = LayoutTemplateStore()
@@ -0,0 +1,154 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from ..config import settings
+
+
+@dataclass
+class FieldSpec:
+    name: str
+    label: Optional[str] = None  # None means the unlabelled text before the first label
+    pattern: str = r".+"
+    type: str = "str"  # str, int, float or datetime
+    datetime_format: str = "%d %b %Y,%I:%M %p"
+
+    def convert(self, raw: str):
+        match = self._value_re.search(raw)
+        if match is None:
+            return None
+        value = match.group(0).strip()
+        if self.type == "int":
+            return int(value)
+        if self.type == "float":
+            return float(value.replace(",", ""))
+        if self.type == "datetime":
+            return datetime.strptime(re.sub(r"\s*,\s*", ",", re.sub(r"\s+", " ", value)), self.datetime_format)
+        return value
+
+    def compile(self):
+        self._value_re = re.compile(self.pattern)
+        self._label_re = re.compile(re.escape(self.label), re.IGNORECASE) if self.label else None
+        return self
+
+
+@dataclass
+class ReceiptTemplate:
+    name: str
+    fields: list[FieldSpec] = field(default_factory=list)
+
+    def compile(self):
+        for spec in self.fields:
+            spec.compile()
+        return self
+
+    def extract(self, text: str):
+        # Every labelled value runs from the end of its label to the next label or line break
+        found = []
+        for spec in self.fields:
+            if spec._label_re is None:
+                continue
+            match = spec._label_re.search(text)
+            if match is not None:
+                found.append((match.start(), match.end(), spec))
+        found.sort(key=lambda item: item[0])
+
+        raw_values = {}
+        leading_end = found[0][0] if found else len(text)
+        for index, (_, end, spec) in enumerate(found):
+            stop = found[index + 1][0] if index + 1 < len(found) else len(text)
+            newline = text.find("\n", end, stop)
+            raw_values[spec.name] = text[end:newline if newline != -1 else stop]
+
+        kvpair = {}
+        for spec in self.fields:
+            raw = text[:leading_end] if spec.label is None else raw_values.get(spec.name)
+            if raw is None:
+                continue
+            try:
+                value = spec.convert(raw.strip(" \n:-"))
+            except ValueError:
+                value = None
+            if value is not None and value != "":
+                kvpair[spec.name] = value
+        return kvpair, len(kvpair) / len(self.fields)
+
+
+@dataclass
+class TemplateMatch:
+    template: str
+    kvpair: dict
+    confidence: float
+
+
+DATETIME_PATTERN = r"\d{1,2}\s*[A-Za-z]{3}\s*\d{4}\s*,\s*\d{1,2}:\d{2}\s*[AP]M"
+AMOUNT_PATTERN = r"\d[\d,]*(?:\.\d+)?"
+
+WALLET_FIELDS_HEAD = [
+    FieldSpec("Description"),
+    FieldSpec("Reference Code", "Reference Code", r"\d+", "int"),
+    FieldSpec("Date/Time", "Date/Time", DATETIME_PATTERN, "datetime"),
+    FieldSpec("Channel", "Channel"),
+    FieldSpec("Payment Attribute", "Payment Attribute"),
+    FieldSpec("Service Name", "Service Name"),
+    FieldSpec("Amount (NPR)", "Amount (NPR)", AMOUNT_PATTERN, "float"),
+    FieldSpec("Initiator", "Initiator"),
+]
+
+DEFAULT_TEMPLATES = [
+    ReceiptTemplate("wallet_transfer", WALLET_FIELDS_HEAD + [
+        FieldSpec("Receiver Name", "Receiver Name"),
+        FieldSpec("Status", "Status"),
+    ]),
+    ReceiptTemplate("wallet_qr_payment", WALLET_FIELDS_HEAD + [
+        FieldSpec("Qr Merchant Name", "Qr Merchant Name"),
+        FieldSpec("Remarks", "Remarks"),
+        FieldSpec("Status", "Status"),
+    ]),
+]
+
+
+class TemplateRegistry:
+    def __init__(self, templates: list[ReceiptTemplate] = None, min_confidence: float = None):
+        self.templates = [template.compile() for template in (templates if templates is not None else DEFAULT_TEMPLATES)]
+        self.min_confidence = settings.template_min_confidence if min_confidence is None else min_confidence
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.llm_fallback = 0
+        self.by_template = {}
+
+    def register(self, template: ReceiptTemplate):
+        self.templates.append(template.compile())
+
+    def match(self, lines: list[str]) -> Optional[TemplateMatch]:
+        text = "\n".join(lines)
+        best = None
+        for template in self.templates:
+            kvpair, confidence = template.extract(text)
+            if best is None or confidence > best.confidence:
+                best = TemplateMatch(template.name, kvpair, confidence)
+        if best is None or best.confidence < self.min_confidence:
+            return None
+        return best
+
+    def record(self, match: Optional[TemplateMatch]):
+        with self._lock:
+            if match is None:
+                self.llm_fallback += 1
+            else:
+                self.fast_path += 1
+                self.by_template[match.template] = self.by_template.get(match.template, 0) + 1
+
+    def stats(self):
+        total = self.fast_path + self.llm_fallback
+        return {
+            "fast_path": self.fast_path,
+            "llm_fallback": self.llm_fallback,
+            "fast_path_ratio": round(self.fast_path / total, 4) if total else None,
+            "by_template": dict(self.by_template),
+        }
+
+
+template_registry = TemplateRegistry()
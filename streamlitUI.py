@@ -1,80 +1,158 @@
 import streamlit as st
 import requests
-from datetime import datetime
-from PIL import Image
-import numpy as np
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 st.title("Financial Records RAG System")
-API_URL = "http://localhost:8000/query"
+API_URL = os.environ.get("RAG_API_URL", "http://localhost:8000")
+STREAM_API_URL = f"{API_URL}/query/stream"
+ADD_DOCS_API_URL = f"{API_URL}/add_docs"
+OCR_KVP_API_URL = f"{API_URL}/ocr_kvp_add_docs/upload"
+# Uploads in flight at once; the server's own OCR limits still apply behind this
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "8"))
 
-def query_api(query):
-    response = requests.post(API_URL, json={"prompt": query})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error("Error querying API")
-        return None
+
+@st.cache_resource
+def http_session():
+    # One keep-alive connection pool shared by every rerun and upload worker
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=UPLOAD_WORKERS + 1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def query_api_stream(query):
+    with http_session().post(STREAM_API_URL, json={"prompt": query}, stream=True) as response:
+        if response.status_code != 200:
+            st.error("Error querying API")
+            return
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
 
 user_query = st.text_input("Enter your financial query:")
 if st.button("Submit", key="ask_query"):
     if user_query:
-        result = query_api(user_query)
-        if result:
-            st.subheader("Response:")
-            st.write(result['response'])
-            if 'source_documents' in result and result['source_documents']:
-                st.subheader("Source Documents:")
-                for doc in result['source_documents']:
-                    st.write(doc)
+        answer = ""
+        answer_placeholder = None
+        for event in query_api_stream(user_query):
+            if event["type"] == "sources":
+                if event["source_documents"]:
+                    st.subheader("Source Documents:")
+                    for doc in event["source_documents"]:
+                        st.write(doc)
+                st.subheader("Response:")
+                answer_placeholder = st.empty()
+            elif event["type"] == "token":
+                answer += event["token"]
+                answer_placeholder.markdown(answer)
+            elif event["type"] == "error":
+                st.error(event["message"])
+            elif event["type"] == "done":
+                # Cached and aggregate answers carry no generation timings
+                if event.get("ttft_ms") is not None:
+                    st.caption(f"First token after {event['ttft_ms']} ms, {event.get('tokens_per_sec')} tokens/s")
+                elif event.get("cache_hit"):
+                    st.caption(f"Cached answer in {event.get('total_ms')} ms")
     else:
         st.warning("Please enter a query.")
  
         
-def add_documents_api(documents):
-    ADD_DOCS_API_URL = "http://localhost:8000/add_docs"
-    response = requests.post(ADD_DOCS_API_URL, json={"documents": documents})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error("Error adding documents")
-        return None 
+def add_documents_api(session, documents):
+    response = session.post(ADD_DOCS_API_URL, json={"documents": documents})
+    response.raise_for_status()
+    return response.json()
+
+
+def ocr_kvp_api(session, name, content, mime_type):
+    files = {"file": (name, content, mime_type)}
+    response = session.post(OCR_KVP_API_URL, files=files)
+    response.raise_for_status()
+    return response.json()
+
+
+def file_key(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def dispatch_uploads(items, call, results_key):
+    # items are (name, content, args). Each file runs on a bounded worker pool over the shared session;
+    # results are kept in session_state by content hash so reruns and re-uploads never repeat the work
+    cache = st.session_state.setdefault(results_key, {})
+    # One entry per key: identical files are sent once, and same-named files keep separate status lines
+    todo = list({key: (name, key, args) for name, key, args in items if key not in cache}.values())
+    if not todo:
+        return
+    # Resolved here in the script thread; worker threads have no Streamlit context for cache_resource
+    session = http_session()
+    progress = st.progress(0.0, text=f"0 / {len(todo)} files")
+    status = {key: st.empty() for _, key, _ in todo}
+    for name, key, _ in todo:
+        status[key].caption(f"{name}: queued")
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = {executor.submit(call, session, *args): (name, key) for name, key, args in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            name, key = futures[future]
+            try:
+                cache[key] = {"name": name, "result": future.result()}
+                status[key].caption(f"{name}: done")
+            except Exception as e:
+                # Failures are not cached, so the next submit retries them
+                status[key].error(f"{name}: {e}")
+            progress.progress(done / len(todo), text=f"{done} / {len(todo)} files")
+
 
-    
 st.subheader("Add Financial Documents")
 doc_files = st.file_uploader(
     "Upload txt file", accept_multiple_files=True, type=["txt"])
 
 
-if st.button("Submit", key="add_docs"):
+if st.button("Submit", key="add_docs") and doc_files:
+    items = []
     for doc_file in doc_files:
-        if doc_file is not None:
-            upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            file_content = doc_file.read().decode("utf-8")
-            document = [{"id": doc_file.name + "_" + upload_time, "content": file_content}]
-            add_result = add_documents_api(document)
-            if add_result:
-                st.success(f"Added {document[0]['id']} documents successfully.")
-                
-                
-def ocr_kvp_api(image_path):
-    OCR_KVP_API_URL = "http://localhost:8000/ocr_kvp_add_docs"
-    response = requests.post(OCR_KVP_API_URL, json={"image_path": image_path})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error("Error extracting KVP from OCR")
-        return None
+        content = doc_file.getvalue()
+        # No id: the content hash is the id, so a re-uploaded file is skipped and same-named files never collide
+        document = [{"content": content.decode("utf-8"), "metadata": {"file_name": doc_file.name}}]
+        items.append((doc_file.name, f"{doc_file.name}:{file_key(content)}", (document,)))
+    dispatch_uploads(items, add_documents_api, "doc_results")
+
+for doc_file in doc_files or []:
+    cached = st.session_state.get("doc_results", {}).get(f"{doc_file.name}:{file_key(doc_file.getvalue())}")
+    if cached:
+        add_result = cached["result"]
+        st.success(
+            f"{doc_file.name}: {add_result['new']} new, {add_result['updated']} updated, {add_result['skipped']} unchanged."
+        )
+
 
 uploaded_files = st.file_uploader("Choose an image...", accept_multiple_files=True, type=["png", "jpg", "jpeg"])
-if uploaded_files is not None:
-    kvp_results = []
-    for uploaded_file in uploaded_files:
-        image = Image.open(uploaded_file)
-        img_array = np.array(image)
-        image_path = f"./temp/temp_{uploaded_file.name}"
-        image.save(image_path)
-        st.image(img_array, caption='Uploaded Image.', use_column_width=True)
-        kvp_results.append(ocr_kvp_api(image_path))
+if uploaded_files:
+    st.image(
+        [uploaded_file.getvalue() for uploaded_file in uploaded_files],
+        caption=[uploaded_file.name for uploaded_file in uploaded_files],
+        width=160,
+    )
+    if st.button("Extract KVP and Add Docs", key="add_kvp_docs"):
+        items = [
+            (
+                uploaded_file.name,
+                file_key(uploaded_file.getvalue()),
+                (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type),
+            )
+            for uploaded_file in uploaded_files
+        ]
+        dispatch_uploads(items, ocr_kvp_api, "kvp_results")
+
+    cache = st.session_state.get("kvp_results", {})
+    kvp_results = [
+        {"file": uploaded_file.name, **cache[key]["result"]}
+        for uploaded_file in uploaded_files
+        if (key := file_key(uploaded_file.getvalue())) in cache
+    ]
     if kvp_results:
         st.subheader("Extracted Key-Value Pairs:")
         st.json(kvp_results)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_bbox import canonical, synthetic_page
+from src.ocr.bbox import OCRBBoxProcessor
+
+SETTINGS = [(0.5, 20), (0.5, 2), (0.1, 0), (0.9, 40)]
+
+
+def random_boxes(rng, n, width=800, height=600):
+    # Unstructured boxes: overlaps, nesting and near-duplicates that synthetic pages rarely produce
+    x1 = rng.uniform(0, width, n)
+    y1 = rng.uniform(0, height, n)
+    boxes = np.stack([x1, y1, x1 + rng.uniform(5, 200, n), y1 + rng.uniform(5, 60, n)], axis=1)
+    duplicates = rng.integers(0, n, n // 5)
+    boxes = np.concatenate([boxes, boxes[duplicates] + rng.uniform(-1, 1, (len(duplicates), 4))])
+    return boxes.tolist()
+
+
+@pytest.mark.parametrize("iou_threshold,proximity_threshold", SETTINGS)
+def test_vectorized_merge_matches_iterative(iou_threshold, proximity_threshold):
+    processor = OCRBBoxProcessor()
+    rng = np.random.default_rng(0)
+    cases = [synthetic_page(rng, n) for n in (0, 1, 10, 50, 200) for _ in range(4)]
+    cases += [random_boxes(rng, n) for n in (2, 10, 40, 120) for _ in range(6)]
+    for boxes in cases:
+        reference = processor.merge_boxes_iterative(boxes, iou_threshold, proximity_threshold)
+        # small_group=0 forces the y-band sweep even for inputs the default would hand to the iterative engine
+        fast = processor.merge_boxes_vectorized(boxes, iou_threshold, proximity_threshold, small_group=0)
+        assert canonical(fast) == canonical(reference), f"{len(boxes)} boxes"
+
+
+@pytest.mark.parametrize("iou_threshold,proximity_threshold", SETTINGS)
+def test_default_dispatch_matches_iterative_on_large_pages(iou_threshold, proximity_threshold):
+    processor = OCRBBoxProcessor()
+    rng = np.random.default_rng(1)
+    cases = [synthetic_page(rng, n) for n in (100, 300) for _ in range(3)] + [random_boxes(rng, 150) for _ in range(3)]
+    for boxes in cases:
+        reference = processor.merge_boxes_iterative(boxes, iou_threshold, proximity_threshold)
+        fast = processor.merge_boxes_vectorized(boxes, iou_threshold, proximity_threshold)
+        assert canonical(fast) == canonical(reference), f"{len(boxes)} boxes"
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+from src.core.metadata import QueryFilterParser, to_timestamp
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+def parse(query, merchants=()):
+    parser = QueryFilterParser()
+    parser.merchants = set(merchants)
+    return parser.parse(query, now=NOW)
+
+
+@pytest.mark.parametrize("query", [
+    "what did I pay on 2024-02-30",
+    "payments between 2024-13-01 and 2024-14-01",
+    "what did I spend in the last 1000000000 days",
+    "payments in December 9999",
+])
+def test_invalid_dates_apply_no_date_filter(query):
+    assert parse(query).where is None
+
+
+def test_valid_iso_date():
+    where = parse("what did I pay on 2024-02-29").where
+    assert where == {"$and": [
+        {"timestamp": {"$gte": to_timestamp(datetime(2024, 2, 29))}},
+        {"timestamp": {"$lt": to_timestamp(datetime(2024, 3, 1))}},
+    ]}
+
+
+def test_merchant_matches_whole_words_only():
+    assert parse("Did I pay the program fee?", merchants={"ram"}).where is None
+    assert parse("How much did I pay Ram?", merchants={"ram"}).where == {"receiver_lc": "ram"}
+
+
+def test_aggregate_needs_a_filter():
+    assert parse("How much did I spend on groceries?").aggregate is None
+    assert parse("How much did I spend last month?").aggregate == "sum"
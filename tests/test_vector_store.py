@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+
+from src.core.vector_store import LocalCollection, matches_where
+
+
+def vectors(n, dim=4):
+    return np.eye(max(n, dim), dim, dtype=np.float32)[:n] * 10
+
+
+def filled(path, n=4):
+    collection = LocalCollection(str(path), "test")
+    collection.add(
+        ids=[f"d{i}" for i in range(n)], embeddings=vectors(n),
+        documents=[f"doc {i}" for i in range(n)], metadatas=[{"i": i, "even": i % 2 == 0} for i in range(n)],
+    )
+    return collection
+
+
+def test_empty_collection_query_and_get(tmp_path):
+    collection = LocalCollection(str(tmp_path), "test")
+    result = collection.query(query_embeddings=[[1.0, 0.0, 0.0, 0.0]], n_results=3)
+    assert result["ids"] == [[]]
+    assert collection.get()["ids"] == []
+    assert collection.count() == 0
+
+
+def test_query_orders_by_distance(tmp_path):
+    collection = filled(tmp_path)
+    result = collection.query(query_embeddings=vectors(4)[2:3], n_results=2)
+    assert result["ids"][0][0] == "d2"
+    assert result["distances"][0][0] == 0
+
+
+def test_upsert_overwrites_existing_and_add_does_not(tmp_path):
+    collection = filled(tmp_path)
+    collection.add(ids=["d1"], embeddings=vectors(4)[3:4], documents=["ignored"])
+    assert collection.get(ids=["d1"])["documents"] == ["doc 1"]
+    collection.upsert(ids=["d1", "d9"], embeddings=vectors(4)[[3, 0]], documents=["new 1", "doc 9"], metadatas=[{"i": 1}, {"i": 9}])
+    assert collection.count() == 5
+    assert collection.get(ids=["d1"])["documents"] == ["new 1"]
+    # d1 now sits on d3's vector, so both are exact matches for it
+    result = collection.query(query_embeddings=vectors(4)[3:4], n_results=2)
+    assert sorted(result["ids"][0]) == ["d1", "d3"]
+    assert result["distances"][0] == [0, 0]
+
+
+def test_where_filters_on_query_and_get(tmp_path):
+    collection = filled(tmp_path)
+    where = {"$and": [{"even": True}, {"i": {"$gte": 1}}]}
+    assert collection.get(where=where)["ids"] == ["d2"]
+    assert collection.query(query_embeddings=vectors(4)[0:1], n_results=4, where=where)["ids"] == [["d2"]]
+    assert collection.get(ids=["d0", "d1", "d2"], where={"even": True})["ids"] == ["d0", "d2"]
+    assert collection.get(where={"missing": 1})["ids"] == []
+    assert not matches_where({"i": "x"}, {"i": {"$gt": 1}})
+
+
+def test_delete_then_reopen(tmp_path):
+    collection = filled(tmp_path)
+    collection.delete(ids=["d1", "nope"])
+    collection.delete(where={"i": 3})
+    assert collection.get()["ids"] == ["d0", "d2"]
+    reopened = LocalCollection(str(tmp_path), "test")
+    assert reopened.get()["ids"] == ["d0", "d2"]
+    assert reopened.query(query_embeddings=vectors(4)[2:3], n_results=1)["ids"] == [["d2"]]
+    assert reopened.vectors.shape == (2, 4)
+
+
+def test_reopen_finishes_an_interrupted_delete(tmp_path):
+    collection = filled(tmp_path)
+    collection.delete(ids=["d0"])
+    # Simulate a crash after the rows committed but before the compacted vectors were swapped in
+    with open(collection.compact_path, "wb") as f:
+        np.asarray(collection.vectors).tofile(f)
+    with open(collection.vector_path, "wb") as f:
+        vectors(4).tofile(f)
+    collection.db.execute("INSERT INTO meta VALUES ('compacting', '1')")
+    collection.db.commit()
+    reopened = LocalCollection(str(tmp_path), "test")
+    assert not os.path.exists(reopened.compact_path)
+    assert reopened.query(query_embeddings=vectors(4)[1:2], n_results=1)["ids"] == [["d1"]]
+
+
+def test_reopen_with_short_vector_file(tmp_path):
+    collection = filled(tmp_path)
+    os.truncate(collection.vector_path, 2 * 4 * 4)
+    reopened = LocalCollection(str(tmp_path), "test")
+    assert reopened.get()["ids"] == ["d0", "d1"]
+    assert reopened.query(query_embeddings=vectors(4)[1:2], n_results=5)["ids"] == [["d1", "d0"]]